@@ -2,10 +2,14 @@
 
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+from ai_video_gen.api.jobs import enqueue_job
 from ai_video_gen.pipeline.compose import compose_video, get_compose_status
+from ai_video_gen.services.ffmpeg import ffmpeg_service
+from ai_video_gen.services.supabase import get_supabase_client
 
 router = APIRouter()
 
@@ -33,10 +37,23 @@ class ComposeResponse(BaseModel):
 
 
 @router.get("/{project_id}/compose/status", response_model=ComposeStatusResponse)
-async def api_get_compose_status(project_id: UUID) -> ComposeStatusResponse:
-    """動画合成の状態を取得"""
+async def api_get_compose_status(
+    project_id: UUID,
+    request: Request,
+    response: Response,
+) -> ComposeStatusResponse | Response:
+    """動画合成の状態を取得
+
+    合成待ちのフロントエンドがポーリングするエンドポイントのため、
+    updated_atベースの弱いETagを返し、未変更時は304で
+    シリアライズと転送をまるごと省く。
+    """
     try:
         result = await get_compose_status(project_id)
+        etag = f'W/"{result.pop("updated_at", None)}-{result["sections_count"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        response.headers["ETag"] = etag
         return ComposeStatusResponse(**result)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -44,9 +61,53 @@ async def api_get_compose_status(project_id: UUID) -> ComposeStatusResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{project_id}/compose/stream")
+async def api_stream_compose(project_id: UUID) -> StreamingResponse:
+    """合成動画をエンコードしながらストリーミング配信
+
+    ffmpegの出力をチャンク単位で転送するため、完成・アップロード完了を
+    待たずにクライアントが受信を開始でき、サーバー側のピークメモリも
+    1チャンク分に収まる。
+    """
+    try:
+        client = get_supabase_client()
+        sections_result = (
+            client.table("sections")
+            .select("id,section_index,type,duration,slide_image_path,narration_audio_path")
+            .eq("project_id", str(project_id))
+            .order("section_index")
+            .execute()
+        )
+        sections = sections_result.data or []
+        if not sections:
+            raise HTTPException(status_code=404, detail="セクションが見つかりません")
+
+        return StreamingResponse(
+            ffmpeg_service.stream_compose(project_id, sections),
+            media_type="video/mp4",
+        )
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/{project_id}/compose", response_model=ComposeResponse)
-async def api_compose_video(project_id: UUID) -> ComposeResponse:
-    """動画を合成"""
+async def api_compose_video(project_id: UUID, background: bool = False):
+    """動画を合成
+
+    background=trueの場合はジョブとして実行し202を即時返却、
+    進捗はWebSocketで通知する。
+    """
+    if background:
+        job_id = await enqueue_job(str(project_id), "composition", lambda: compose_video(project_id))
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "project_id": str(project_id), "stage": "composition"},
+        )
+
     try:
         result = await compose_video(project_id)
         return ComposeResponse(**result)
@@ -0,0 +1,76 @@
+"""バックグラウンドジョブ実行
+
+compose/narration/visualsのような長時間パイプラインをHTTP接続を
+保持したまま待たせず、ジョブとして実行して進捗をWebSocketで通知する。
+
+ジョブは有界キュー＋固定数のワーカーで処理する。キューが満杯の場合は
+enqueue_jobのputが待機するため、バースト時もタスクが無制限に積み上がって
+メモリを食い潰すことがない（自然なバックプレッシャー）。
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from uuid import uuid4
+
+from ai_video_gen.api.ws import manager
+from ai_video_gen.config import settings
+
+# ジョブ（job_id, project_id, stage, runner）の有界キュー
+job_queue: asyncio.Queue[tuple[str, str, str, Callable[[], Awaitable[dict | list]]]] = (
+    asyncio.Queue(maxsize=settings.max_pending_jobs)
+)
+
+# 起動済みワーカータスク
+_worker_tasks: list[asyncio.Task] = []
+
+
+async def enqueue_job(
+    project_id: str,
+    stage: str,
+    runner: Callable[[], Awaitable[dict | list]],
+) -> str:
+    """ジョブをキューに投入してjob_idを返す
+
+    キューが満杯の場合はここで空きが出るまで待機する。
+    進捗・完了・エラーは既存のConnectionManager経由で
+    /ws/projects/{project_id}/progress に通知される。
+    """
+    job_id = str(uuid4())
+    await job_queue.put((job_id, project_id, stage, runner))
+    return job_id
+
+
+async def _worker() -> None:
+    """キューからジョブを取り出して順次実行するワーカーループ"""
+    while True:
+        _job_id, project_id, stage, runner = await job_queue.get()
+        try:
+            await manager.send_progress(project_id, stage, 0, f"{stage}の処理を開始しました")
+            result = await runner()
+            payload = result if isinstance(result, dict) else {"results": result}
+            await manager.send_complete(project_id, stage, payload)
+        except Exception as e:
+            await manager.send_error(project_id, stage, str(e))
+        finally:
+            job_queue.task_done()
+
+
+def start_workers() -> None:
+    """ワーカープールを起動（アプリ起動時に呼ぶ）"""
+    if _worker_tasks:
+        return
+    for _ in range(settings.job_workers):
+        _worker_tasks.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers() -> None:
+    """ワーカープールを停止（アプリ終了時に呼ぶ）"""
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+
+def get_pending_job_count() -> int:
+    """待機中のジョブ数を取得"""
+    return job_queue.qsize()
@@ -3,8 +3,10 @@
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from ai_video_gen.api.jobs import enqueue_job
 from ai_video_gen.pipeline.narration import (
     generate_narrations,
     get_section_narration,
@@ -46,12 +48,24 @@ class VoiceResponse(BaseModel):
 
 
 @router.post("/{project_id}/generate-narration", response_model=NarrationsResponse)
-async def api_generate_narrations(project_id: UUID) -> NarrationsResponse:
-    """全セクションのナレーションを生成"""
+async def api_generate_narrations(project_id: UUID, background: bool = False):
+    """全セクションのナレーションを生成
+
+    background=trueの場合はジョブとして実行し202を即時返却、
+    進捗はWebSocket（/ws/projects/{project_id}/progress）で通知する。
+    """
+    if background:
+        job_id = await enqueue_job(str(project_id), "narration", lambda: generate_narrations(project_id))
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "project_id": str(project_id), "stage": "narration"},
+        )
+
     try:
         results = await generate_narrations(project_id)
+        # パイプライン内部の値は検証済みなのでmodel_constructでバリデーションを省く
         narrations = [
-            NarrationResponse(
+            NarrationResponse.model_construct(
                 section_id=str(r["section_id"]),
                 section_index=r["section_index"],
                 status=r["status"],
@@ -5,6 +5,7 @@ from uuid import UUID
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from ai_video_gen.pipeline.assets import generate_assets
 from ai_video_gen.pipeline.script import generate_script, update_script, convert_document_to_script
 
 router = APIRouter()
@@ -42,6 +43,17 @@ async def api_generate_script(project_id: UUID) -> ScriptResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/{project_id}/generate-assets")
+async def api_generate_assets(project_id: UUID) -> dict:
+    """ビジュアルとナレーションをまとめて並行生成"""
+    try:
+        return await generate_assets(project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.put("/{project_id}/script", response_model=ScriptResponse)
 async def api_update_script(
     project_id: UUID,
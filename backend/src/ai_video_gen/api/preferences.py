@@ -1,5 +1,7 @@
 """好みAPI"""
 
+from collections import OrderedDict
+from hashlib import blake2b
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException
@@ -7,16 +9,22 @@ from pydantic import BaseModel
 
 from ai_video_gen.feedback.correction_store import CorrectionEvent, correction_store
 from ai_video_gen.feedback.preference_engine import Preference, preference_engine
-from ai_video_gen.feedback.visual_diff import visual_diff_analyzer
+from ai_video_gen.feedback.visual_diff import VisualDiffResult, visual_diff_analyzer
 
 router = APIRouter()
 
+# 差分分析のコンテンツアドレスキャッシュ（画像ペアのハッシュ -> 結果）。
+# エディタの再オープンやリトライによる同一画像の再分析でLLM呼び出しを繰り返さない
+_diff_cache: OrderedDict[str, VisualDiffResult] = OrderedDict()
+_DIFF_CACHE_MAX = 128
+
 
 # リクエスト/レスポンスモデル
 class CorrectionRequest(BaseModel):
     """修正記録リクエスト"""
-    project_id: str
-    section_id: str | None = None
+    # UUIDはバリデーション時に1回だけパースし、以降は文字列化して引き回す
+    project_id: UUID
+    section_id: UUID | None = None
     stage: str
     category: str
     field_path: str
@@ -40,7 +48,7 @@ class PreferenceCreate(BaseModel):
     category: str
     scope: str = "global"
     section_type: str | None = None
-    project_id: str | None = None
+    project_id: UUID | None = None
     confidence: float = 0.5
 
 
@@ -62,8 +70,8 @@ async def record_correction(request: CorrectionRequest) -> dict:
     """修正を記録"""
     try:
         event = CorrectionEvent(
-            project_id=request.project_id,
-            section_id=request.section_id,
+            project_id=str(request.project_id),
+            section_id=str(request.section_id) if request.section_id else None,
             stage=request.stage,
             category=request.category,
             field_path=request.field_path,
@@ -80,16 +88,15 @@ async def record_correction(request: CorrectionRequest) -> dict:
 
 @router.get("/corrections")
 async def get_corrections(
-    project_id: str | None = None,
+    project_id: UUID | None = None,
     stage: str | None = None,
     category: str | None = None,
     limit: int = 100,
 ) -> list[dict]:
     """修正ログを取得"""
     try:
-        project_uuid = UUID(project_id) if project_id else None
         return await correction_store.get_corrections(
-            project_id=project_uuid,
+            project_id=project_id,
             stage=stage,
             category=category,
             limit=limit,
@@ -112,23 +119,40 @@ async def get_correction_stats() -> dict:
 async def analyze_visual_diff(request: VisualDiffRequest) -> dict:
     """ビジュアル差分を分析"""
     try:
-        result = await visual_diff_analyzer.analyze_diff(
-            original_image=request.original_image,
-            edited_image=request.edited_image,
-        )
-
-        # 修正ログにも記録
+        # 画像ペアのハッシュをキーに結果をキャッシュ（同一再送信はLLM呼び出しをスキップ）
+        cache_key = blake2b(
+            request.original_image.encode() + b"|" + request.edited_image.encode(),
+            digest_size=16,
+        ).hexdigest()
+
+        # 記録用の短縮形はawait前に一度だけ作っておく（複数MBのbase64を後段まで保持しない）
+        orig_short = request.original_image[:100] + "..."
+        edit_short = request.edited_image[:100] + "..."
+
+        result = _diff_cache.get(cache_key)
+        if result is not None:
+            _diff_cache.move_to_end(cache_key)
+        else:
+            result = await visual_diff_analyzer.analyze_diff(
+                original_image=request.original_image,
+                edited_image=request.edited_image,
+            )
+            _diff_cache[cache_key] = result
+            if len(_diff_cache) > _DIFF_CACHE_MAX:
+                _diff_cache.popitem(last=False)
+
+        # 修正ログにも記録（結果は使わないのでバッチ書き込みに委ねる）
         event = CorrectionEvent(
             project_id=request.project_id,
             section_id=request.section_id,
             stage="image",
             category="style",
             field_path="slide_image",
-            original_image_path=request.original_image[:100] + "...",  # 短縮
-            edited_image_path=request.edited_image[:100] + "...",
+            original_image_path=orig_short,
+            edited_image_path=edit_short,
             visual_diff_description=result.overall_preference,
         )
-        await correction_store.record_correction(event)
+        await correction_store.record_correction_deferred(event)
 
         return {
             "changes": [c.model_dump() for c in result.changes],
@@ -178,7 +202,7 @@ async def create_preference(request: PreferenceCreate) -> dict:
             category=request.category,
             scope=request.scope,
             section_type=request.section_type,
-            project_id=request.project_id,
+            project_id=str(request.project_id) if request.project_id else None,
             confidence=request.confidence,
         )
         result = await preference_engine.save_preference(pref)
@@ -228,11 +252,8 @@ async def evolve_preferences(request: EvolveRequest) -> dict:
         # 好みを推論
         inferred = await preference_engine.infer_preferences(corrections)
 
-        # 保存
-        saved = []
-        for pref in inferred:
-            result = await preference_engine.save_preference(pref)
-            saved.append(result)
+        # 一括保存（好みごとのINSERT往復をまとめる）
+        saved = await preference_engine.save_preferences(inferred)
 
         return {
             "status": "evolved",
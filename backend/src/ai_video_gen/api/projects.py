@@ -3,19 +3,34 @@
 from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
 
 from ai_video_gen.models import Project, ProjectCreate, ProjectState, ProjectUpdate
-from ai_video_gen.services.supabase import get_supabase_client
+from ai_video_gen.services.supabase import get_async_supabase_client
 
 router = APIRouter()
 
+# 一覧レスポンス用のTypeAdapter。Pythonループでの逐次Project(**p)より
+# Rustコア側の一括バリデーションの方が速い
+_project_list_adapter = TypeAdapter(list[Project])
+
+
+def _etag_for_rows(rows: list[dict]) -> str:
+    """行セットから弱いETagを生成（件数 + 最新updated_at）
+
+    フロントエンドはプロジェクト一覧をポーリングするため、未変更時は
+    304で返してバリデーション・シリアライズと転送をまるごと省く。
+    """
+    latest = max((row.get("updated_at") or "" for row in rows), default="")
+    return f'W/"{len(rows)}-{latest}"'
+
 
 @router.post("", response_model=Project, status_code=status.HTTP_201_CREATED)
 async def create_project(project: ProjectCreate) -> Project:
     """新規プロジェクト作成"""
     try:
-        client = get_supabase_client()
+        client = await get_async_supabase_client()
         now = datetime.now(timezone.utc)
 
         data = {
@@ -27,7 +42,7 @@ async def create_project(project: ProjectCreate) -> Project:
             "updated_at": now.isoformat(),
         }
 
-        result = client.table("projects").insert(data).execute()
+        result = await client.table("projects").insert(data).execute()
 
         if not result.data:
             raise HTTPException(status_code=500, detail="プロジェクト作成に失敗しました")
@@ -40,43 +55,75 @@ async def create_project(project: ProjectCreate) -> Project:
 
 
 @router.get("", response_model=list[Project])
-async def list_projects() -> list[Project]:
-    """プロジェクト一覧取得"""
+async def list_projects(
+    request: Request,
+    response: Response,
+    include_sections: bool = False,
+) -> list[Project] | Response:
+    """プロジェクト一覧取得
+
+    include_sections=trueの場合はセクションも埋め込みクエリで一括取得する
+    （プロジェクトごとの再取得によるN+1を防ぐ）。
+    If-None-MatchがETagと一致すれば304を返し、シリアライズを省略する。
+    """
     try:
-        client = get_supabase_client()
-        result = client.table("projects").select("*").order("created_at", desc=True).execute()
-
-        projects = []
-        for p in result.data:
-            projects.append(Project(**p, sections=[]))
-
-        return projects
+        client = await get_async_supabase_client()
+
+        if include_sections:
+            result = await (
+                client.table("projects")
+                .select("*, sections(*)")
+                .order("created_at", desc=True)
+                .order("section_index", foreign_table="sections")
+                .execute()
+            )
+        else:
+            result = await (
+                client.table("projects").select("*").order("created_at", desc=True).execute()
+            )
+
+        rows = result.data or []
+        etag = _etag_for_rows(rows)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+
+        response.headers["ETag"] = etag
+        # sections未取得時はモデルのデフォルト（[]）に任せる
+        return _project_list_adapter.validate_python(rows)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/{project_id}", response_model=Project)
-async def get_project(project_id: UUID) -> Project:
+async def get_project(
+    project_id: UUID,
+    request: Request,
+    response: Response,
+) -> Project | Response:
     """プロジェクト詳細取得"""
     try:
-        client = get_supabase_client()
+        client = await get_async_supabase_client()
 
-        # プロジェクト取得
-        result = client.table("projects").select("*").eq("id", str(project_id)).execute()
+        # プロジェクトとセクションを埋め込みクエリで一括取得（往復2回→1回）
+        result = await (
+            client.table("projects")
+            .select("*, sections(*)")
+            .eq("id", str(project_id))
+            .order("section_index", foreign_table="sections")
+            .execute()
+        )
 
         if not result.data:
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        # セクション取得
-        sections_result = (
-            client.table("sections")
-            .select("*")
-            .eq("project_id", str(project_id))
-            .order("section_index")
-            .execute()
-        )
+        row = result.data[0]
+        # セクション側の更新もETagに反映する
+        etag = _etag_for_rows([row, *(row.get("sections") or [])])
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED)
 
-        return Project(**result.data[0], sections=sections_result.data or [])
+        response.headers["ETag"] = etag
+        return Project(**row)
     except HTTPException:
         raise
     except Exception as e:
@@ -87,7 +134,7 @@ async def get_project(project_id: UUID) -> Project:
 async def update_project(project_id: UUID, update: ProjectUpdate) -> Project:
     """プロジェクト更新"""
     try:
-        client = get_supabase_client()
+        client = await get_async_supabase_client()
 
         # 更新データを構築
         data = update.model_dump(exclude_unset=True)
@@ -95,7 +142,7 @@ async def update_project(project_id: UUID, update: ProjectUpdate) -> Project:
             data["state"] = data["state"].value
         data["updated_at"] = datetime.now(timezone.utc).isoformat()
 
-        result = (
+        result = await (
             client.table("projects")
             .update(data)
             .eq("id", str(project_id))
@@ -116,9 +163,9 @@ async def update_project(project_id: UUID, update: ProjectUpdate) -> Project:
 async def delete_project(project_id: UUID) -> None:
     """プロジェクト削除"""
     try:
-        client = get_supabase_client()
+        client = await get_async_supabase_client()
 
-        result = (
+        result = await (
             client.table("projects")
             .delete()
             .eq("id", str(project_id))
@@ -3,8 +3,10 @@
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from ai_video_gen.api.jobs import enqueue_job
 from ai_video_gen.pipeline.visuals import (
     generate_visuals,
     get_section_slide,
@@ -36,12 +38,24 @@ class VisualsResponse(BaseModel):
 
 
 @router.post("/{project_id}/generate-visuals", response_model=VisualsResponse)
-async def api_generate_visuals(project_id: UUID) -> VisualsResponse:
-    """全セクションのビジュアルを生成"""
+async def api_generate_visuals(project_id: UUID, background: bool = False):
+    """全セクションのビジュアルを生成
+
+    background=trueの場合はジョブとして実行し202を即時返却、
+    進捗はWebSocketで通知する。
+    """
+    if background:
+        job_id = await enqueue_job(str(project_id), "visuals", lambda: generate_visuals(project_id))
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "project_id": str(project_id), "stage": "visuals"},
+        )
+
     try:
         results = await generate_visuals(project_id)
+        # パイプライン内部の値は検証済みなのでmodel_constructでバリデーションを省く
         slides = [
-            SlideResponse(
+            SlideResponse.model_construct(
                 section_id=str(r["section_id"]),
                 section_index=r["section_index"],
                 type=r["type"],
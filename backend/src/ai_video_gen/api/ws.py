@@ -1,87 +1,89 @@
 """WebSocket進捗通知"""
 
 import asyncio
-import json
 from uuid import UUID
 
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 router = APIRouter()
 
+# pingフレームは固定なので起動時に1回だけシリアライズしておく
+_PING_FRAME = orjson.dumps({"type": "ping"}).decode()
+
 
 class ConnectionManager:
     """WebSocket接続管理"""
 
     def __init__(self):
-        # project_id -> list of websockets
-        self.active_connections: dict[str, list[WebSocket]] = {}
+        # project_id -> set of websockets（削除・存在確認をO(1)にする）
+        self.active_connections: dict[str, set[WebSocket]] = {}
 
     async def connect(self, websocket: WebSocket, project_id: str):
         """接続を追加"""
         await websocket.accept()
-        if project_id not in self.active_connections:
-            self.active_connections[project_id] = []
-        self.active_connections[project_id].append(websocket)
+        self.active_connections.setdefault(project_id, set()).add(websocket)
 
     def disconnect(self, websocket: WebSocket, project_id: str):
         """接続を削除"""
         if project_id in self.active_connections:
-            if websocket in self.active_connections[project_id]:
-                self.active_connections[project_id].remove(websocket)
+            self.active_connections[project_id].discard(websocket)
             if not self.active_connections[project_id]:
                 del self.active_connections[project_id]
 
+    async def _broadcast(self, project_id: str, data: str) -> None:
+        """全ピアへ並行送信（遅いピアが他ピアの配信をブロックしない）"""
+
+        async def _send(websocket: WebSocket) -> None:
+            try:
+                await websocket.send_text(data)
+            except Exception:
+                pass
+
+        await asyncio.gather(
+            *(_send(ws) for ws in list(self.active_connections.get(project_id, [])))
+        )
+
     async def send_progress(self, project_id: str, stage: str, progress: int, message: str):
         """進捗を送信"""
         if project_id not in self.active_connections:
             return
 
-        data = json.dumps({
+        # フレームは1回だけシリアライズして全ピアで使い回す
+        data = orjson.dumps({
             "type": "progress",
             "stage": stage,
             "progress": progress,
             "message": message,
-        })
+        }).decode()
 
-        for websocket in self.active_connections[project_id]:
-            try:
-                await websocket.send_text(data)
-            except Exception:
-                pass
+        await self._broadcast(project_id, data)
 
     async def send_complete(self, project_id: str, stage: str, result: dict | None = None):
         """完了を送信"""
         if project_id not in self.active_connections:
             return
 
-        data = json.dumps({
+        data = orjson.dumps({
             "type": "complete",
             "stage": stage,
             "result": result,
-        })
+        }).decode()
 
-        for websocket in self.active_connections[project_id]:
-            try:
-                await websocket.send_text(data)
-            except Exception:
-                pass
+        await self._broadcast(project_id, data)
 
     async def send_error(self, project_id: str, stage: str, error: str):
         """エラーを送信"""
         if project_id not in self.active_connections:
             return
 
-        data = json.dumps({
+        data = orjson.dumps({
             "type": "error",
             "stage": stage,
             "error": error,
-        })
+        }).decode()
 
-        for websocket in self.active_connections[project_id]:
-            try:
-                await websocket.send_text(data)
-            except Exception:
-                pass
+        await self._broadcast(project_id, data)
 
 
 # グローバルマネージャー
@@ -107,7 +109,7 @@ async def websocket_progress(websocket: WebSocket, project_id: UUID):
                     await websocket.send_text("pong")
             except asyncio.TimeoutError:
                 # タイムアウト時はpingを送信
-                await websocket.send_text(json.dumps({"type": "ping"}))
+                await websocket.send_text(_PING_FRAME)
     except WebSocketDisconnect:
         manager.disconnect(websocket, project_id_str)
     except Exception:
@@ -23,5 +23,25 @@ class Settings(BaseSettings):
     debug: bool = False
     cors_origins: list[str] = ["http://localhost:3000"]
 
+    # 並列実行設定（ElevenLabsプランの同時リクエスト上限に合わせる。Starter=3）
+    elevenlabs_concurrency: int = 3
+    image_gen_concurrency: int = 4  # 画像生成APIの同時リクエスト数
+    ffmpeg_workers: int = 0  # 同時ffmpegプロセス数（0=コア数の半分）
+    ffmpeg_hwaccel: str = "auto"  # ハードウェアエンコーダ検出（auto / none）
+    ffmpeg_tmpfs: bool = False  # 中間ファイルを/dev/shm（RAM）に置く
+
+    # バックグラウンドジョブ設定
+    max_pending_jobs: int = 20  # キューに積める待機ジョブの上限
+    job_workers: int = 2  # 同時に実行するジョブ数
+
+    # LLM応答キャッシュ（同一入力の再推論をスキップ）
+    llm_cache_enabled: bool = True
+    llm_cache_dir: str = "data/llm_cache"
+    llm_cache_ttl_days: int = 7
+
+    # TTS音声キャッシュ（同一テキスト・音声・モデルの再合成をスキップ）
+    tts_cache_enabled: bool = True
+    tts_cache_dir: str = "data/tts_cache"
+
 
 settings = Settings()
@@ -1,14 +1,20 @@
 """修正ログ管理（イベントソーシング）"""
 
+import asyncio
+import time
+from functools import cached_property
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from ai_video_gen.services.supabase import get_supabase_client
 
 
 class CorrectionEvent(BaseModel):
     """修正イベント"""
+    # 追記専用イベントなのでfrozenにする
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     project_id: str
     section_id: str | None = None
     stage: str  # script / narration / image / animation / composition
@@ -26,27 +32,84 @@ class CorrectionEvent(BaseModel):
 class CorrectionStore:
     """修正ログストア"""
 
+    # バックグラウンドフラッシュの設定（最大50件または200msごとに一括INSERT）
+    FLUSH_BATCH_SIZE = 50
+    FLUSH_INTERVAL = 0.2
+
+    def __init__(self):
+        self._queue: asyncio.Queue[CorrectionEvent] = asyncio.Queue()
+        self._flusher_task: asyncio.Task | None = None
+
+    @cached_property
+    def _client(self):
+        """Supabaseクライアント（初回利用時に解決して以降はインスタンスに束縛）"""
+        return get_supabase_client()
+
     async def record_correction(self, event: CorrectionEvent) -> dict:
-        """修正イベントを記録"""
-        client = get_supabase_client()
-
-        data = {
-            "project_id": event.project_id,
-            "section_id": event.section_id,
-            "stage": event.stage,
-            "category": event.category,
-            "field_path": event.field_path,
-            "prior_value": event.prior_value,
-            "new_value": event.new_value,
-            "original_prompt": event.original_prompt,
-            "user_feedback": event.user_feedback,
-            "original_image_path": event.original_image_path,
-            "edited_image_path": event.edited_image_path,
-            "visual_diff_description": event.visual_diff_description,
-        }
+        """修正イベントを記録（即時INSERT、挿入行を返す）"""
+        results = await self.record_corrections([event])
+        return results[0] if results else {}
+
+    async def record_corrections(self, events: list[CorrectionEvent]) -> list[dict]:
+        """複数の修正イベントを1回のINSERTでまとめて記録"""
+        if not events:
+            return []
 
+        client = self._client
+        data = [event.model_dump() for event in events]
         result = client.table("corrections").insert(data).execute()
-        return result.data[0] if result.data else {}
+        return result.data or []
+
+    async def record_correction_deferred(self, event: CorrectionEvent) -> None:
+        """修正イベントをキューに積み、バックグラウンドで一括記録する
+
+        連続修正のバーストでイベントごとにHTTP往復しないための経路。
+        挿入結果が不要な呼び出し元で使う。
+        """
+        await self._queue.put(event)
+
+    def start_flusher(self) -> None:
+        """バックグラウンドフラッシャーを起動（アプリ起動時に呼ぶ）"""
+        if self._flusher_task is None:
+            self._flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        """キューからイベントを集めて一括INSERTし続ける"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while len(batch) < self.FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except TimeoutError:
+                    break
+            try:
+                await self.record_corrections(batch)
+            except Exception:
+                # 記録失敗でフラッシャー自体は止めない（修正ログは補助データ）
+                pass
+
+    async def flush(self) -> None:
+        """キューに残っているイベントを即時に書き出す"""
+        batch: list[CorrectionEvent] = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self.record_corrections(batch)
+
+    async def stop_flusher(self) -> None:
+        """フラッシャーを停止し、残イベントを書き出す（アプリ終了時に呼ぶ）"""
+        if self._flusher_task is not None:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        await self.flush()
 
     async def get_corrections(
         self,
@@ -57,7 +120,7 @@ class CorrectionStore:
         limit: int = 100,
     ) -> list[dict]:
         """修正ログを取得"""
-        client = get_supabase_client()
+        client = self._client
 
         query = client.table("corrections").select("*")
 
@@ -77,7 +140,7 @@ class CorrectionStore:
 
     async def get_recent_corrections(self, limit: int = 50) -> list[dict]:
         """最近の修正ログを取得"""
-        client = get_supabase_client()
+        client = self._client
 
         result = (
             client.table("corrections")
@@ -94,27 +157,16 @@ class CorrectionStore:
         return await self.get_corrections(category=category)
 
     async def get_correction_stats(self) -> dict:
-        """修正統計を取得"""
-        client = get_supabase_client()
-
-        # 全件取得して集計（Supabaseの制限内で）
-        result = client.table("corrections").select("stage, category").execute()
-        corrections = result.data or []
-
-        stats = {
-            "total": len(corrections),
-            "by_stage": {},
-            "by_category": {},
-        }
-
-        for c in corrections:
-            stage = c.get("stage", "unknown")
-            category = c.get("category", "unknown")
+        """修正統計を取得
 
-            stats["by_stage"][stage] = stats["by_stage"].get(stage, 0) + 1
-            stats["by_category"][category] = stats["by_category"].get(category, 0) + 1
+        集計はPostgres側のRPC（correction_stats）で行い、結果のJSONだけを
+        受け取る。全行をネットワーク越しに取得してPythonで数えるより
+        行数に対してスケールする。
+        """
+        client = self._client
 
-        return stats
+        result = client.rpc("correction_stats").execute()
+        return result.data or {"total": 0, "by_stage": {}, "by_category": {}}
 
 
 # シングルトンインスタンス
@@ -0,0 +1,62 @@
+"""LLM応答のコンテンツアドレスキャッシュ
+
+好み推論・ビジュアル差分などのLLM呼び出しは入力が同じなら結果を
+使い回せる。リクエスト内容のSHA-256をキーに結果JSONをディスクへ保存し、
+同一入力の再実行を数秒のLLM呼び出しからほぼゼロレイテンシに短縮する。
+"""
+
+import json
+import time
+from hashlib import sha256
+from pathlib import Path
+
+from ai_video_gen.config import settings
+
+
+def make_key(*parts: str) -> str:
+    """キャッシュキーを生成（入力要素を連結してSHA-256）"""
+    digest = sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> Path:
+    return Path(settings.llm_cache_dir) / f"{key}.json"
+
+
+async def get(key: str) -> dict | None:
+    """キャッシュから取得。期限切れ・未存在・破損はNone"""
+    if not settings.llm_cache_enabled:
+        return None
+
+    path = _cache_path(key)
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    ttl_seconds = settings.llm_cache_ttl_days * 86400
+    if time.time() - entry.get("saved_at", 0) > ttl_seconds:
+        # 期限切れは消しておく（失敗しても実害なし）
+        path.unlink(missing_ok=True)
+        return None
+
+    return entry.get("value")
+
+
+async def set(key: str, value: dict) -> None:
+    """キャッシュへ保存（書き込み失敗は無視して処理を続行）"""
+    if not settings.llm_cache_enabled:
+        return
+
+    path = _cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps({"saved_at": time.time(), "value": value}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+    except OSError:
+        pass
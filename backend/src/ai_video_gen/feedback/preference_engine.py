@@ -1,15 +1,55 @@
 """CIPHER式好み推論エンジン"""
 
+import re
+import time
+from functools import cached_property
 from uuid import UUID
 
-from pydantic import BaseModel
+import orjson
+from pydantic import BaseModel, ConfigDict
 
 from ai_video_gen.config import settings
+from ai_video_gen.feedback import llm_cache
+from ai_video_gen.services.http import post_with_retries
 from ai_video_gen.services.supabase import get_supabase_client
 
+# LLM出力からJSON配列を切り出すための事前コンパイル済み正規表現
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+
+# 確信度閾値。比較の多いループから属性参照なしで使えるようモジュール定数
+SILENT_APPLY_THRESHOLD = 0.85  # 自動適用
+SUGGEST_THRESHOLD = 0.50  # 提案
+# < 0.50 は記録のみ
+
+# 好み推論の固定指示。毎回同じ内容を送るため、Anthropicのプロンプト
+# キャッシュ対象（systemブロック）として切り出す
+INFER_SYSTEM_PROMPT = """あなたはユーザーの好みを分析するアシスタントです。
+ユーザーが教育動画のコンテンツに加えた修正ログが与えられるので、
+修正パターンからユーザーの好みを推論してください。
+
+以下の形式でJSON配列として出力してください:
+[
+  {
+    "description": "好みの説明（具体的に）",
+    "category": "style" | "structural" | "content" | "technical",
+    "scope": "global" | "section_type" | "project",
+    "section_type": "title" | "slide" | "code" | "summary" | null,
+    "confidence": 0.0-1.0（確信度）
+  }
+]
+
+注意:
+- 複数回同じパターンの修正があれば確信度を上げる
+- 1-2回のみの修正は確信度0.3-0.5程度
+- 5回以上の一貫した修正は確信度0.8以上
+"""
+
 
 class Preference(BaseModel):
     """ユーザーの好み"""
+    # 生成後に書き換えないのでfrozenにする（ハッシュ可能・意図しない変更を防止）
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     preference_id: str | None = None
     description: str
     category: str  # style / structural / content / technical
@@ -25,17 +65,36 @@ class Preference(BaseModel):
 class PreferenceEngine:
     """好み推論エンジン"""
 
-    # 確信度閾値
-    SILENT_APPLY_THRESHOLD = 0.85  # 自動適用
-    SUGGEST_THRESHOLD = 0.50  # 提案
-    # < 0.50 は記録のみ
+    # 確信度閾値（後方互換のためクラス属性としても公開）
+    SILENT_APPLY_THRESHOLD = SILENT_APPLY_THRESHOLD
+    SUGGEST_THRESHOLD = SUGGEST_THRESHOLD
+
+    # 適用可能な好みのキャッシュTTL（1本の動画生成中の同一クエリをまとめる）
+    APPLICABLE_CACHE_TTL = 60.0
 
     def __init__(self):
         self.api_key = settings.anthropic_api_key
+        # プロファイルキャッシュ。好みの書き込み時に無効化する
+        self._profile_cache: dict | None = None
+        # (project_id, section_type) -> (取得時刻, 結果)。書き込み時に全消去
+        self._applicable_cache: dict[
+            tuple[str | None, str | None], tuple[float, list[dict]]
+        ] = {}
+
+    def _invalidate_caches(self) -> None:
+        """好みの書き込み後に読み取りキャッシュを無効化する"""
+        self._profile_cache = None
+        self._applicable_cache.clear()
+
+    @cached_property
+    def _client(self):
+        """Supabaseクライアント（初回利用時に解決して以降はインスタンスに束縛）"""
+        return get_supabase_client()
 
     async def infer_preferences(
         self,
         corrections: list[dict],
+        use_cache: bool = True,
     ) -> list[Preference]:
         """修正ログから好みを推論"""
         if not corrections:
@@ -45,59 +104,56 @@ class PreferenceEngine:
             # モックモード
             return self._mock_infer_preferences(corrections)
 
-        import httpx
-
-        # 修正ログを整形
+        # 修正ログを整形（動的な部分だけをユーザーメッセージに載せる）
         corrections_text = self._format_corrections(corrections)
 
-        prompt = f"""
-以下はユーザーが教育動画のコンテンツに加えた修正ログです。
-これらの修正パターンから、ユーザーの好みを推論してください。
-
-修正ログ:
-{corrections_text}
+        # 同一の修正セットに対する推論結果はディスクキャッシュから返す
+        cache_key = llm_cache.make_key("infer_preferences", corrections_text)
+        if use_cache:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return [Preference(**item) for item in cached.get("preferences", [])]
+
+        # 共有プールクライアント + 一時的な失敗の再試行。モックへの
+        # フォールバックは再試行が尽きた後だけ発生する
+        response = await post_with_retries(
+            "https://api.anthropic.com/v1/messages",
+            headers={
+                "x-api-key": self.api_key,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            json={
+                "model": "claude-sonnet-4-20250514",
+                "max_tokens": 1024,
+                # 固定指示はキャッシュ対象。TTL内の連続推論では
+                # プレフィックスのKV状態が再利用される
+                "system": [
+                    {
+                        "type": "text",
+                        "text": INFER_SYSTEM_PROMPT,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+                "messages": [
+                    {"role": "user", "content": f"修正ログ:\n{corrections_text}"}
+                ],
+            },
+        )
 
-以下の形式でJSON配列として出力してください:
-[
-  {{
-    "description": "好みの説明（具体的に）",
-    "category": "style" | "structural" | "content" | "technical",
-    "scope": "global" | "section_type" | "project",
-    "section_type": "title" | "slide" | "code" | "summary" | null,
-    "confidence": 0.0-1.0（確信度）
-  }}
-]
+        if response.status_code != 200:
+            return self._mock_infer_preferences(corrections)
 
-注意:
-- 複数回同じパターンの修正があれば確信度を上げる
-- 1-2回のみの修正は確信度0.3-0.5程度
-- 5回以上の一貫した修正は確信度0.8以上
-"""
+        result = response.json()
+        text = result["content"][0]["text"]
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": "claude-sonnet-4-20250514",
-                    "max_tokens": 1024,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ],
-                },
+        preferences = self._parse_preferences(text, corrections)
+        if use_cache:
+            await llm_cache.set(
+                cache_key,
+                {"preferences": [p.model_dump() for p in preferences]},
             )
-
-            if response.status_code != 200:
-                return self._mock_infer_preferences(corrections)
-
-            result = response.json()
-            text = result["content"][0]["text"]
-
-            return self._parse_preferences(text, corrections)
+        return preferences
 
     def _format_corrections(self, corrections: list[dict]) -> str:
         """修正ログをテキスト形式に整形"""
@@ -119,22 +175,14 @@ class PreferenceEngine:
         corrections: list[dict],
     ) -> list[Preference]:
         """推論結果をパース"""
-        import json
-
         try:
-            # JSON部分を抽出
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
-
-            # JSON配列の開始位置を探す
-            start = text.find("[")
-            end = text.rfind("]") + 1
-            if start >= 0 and end > start:
-                text = text[start:end]
+            # コードフェンスごと正規表現で最初のJSON配列を切り出し、
+            # orjsonでパースする（stdlib jsonより数倍速い）
+            match = _JSON_ARRAY_RE.search(text)
+            if match is None:
+                return self._mock_infer_preferences(corrections)
 
-            data = json.loads(text.strip())
+            data = orjson.loads(match.group(0))
 
             correction_ids = [c.get("event_id", "") for c in corrections if c.get("event_id")]
 
@@ -152,7 +200,7 @@ class PreferenceEngine:
 
             return preferences
 
-        except (json.JSONDecodeError, KeyError, ValueError):
+        except (orjson.JSONDecodeError, KeyError, ValueError):
             return self._mock_infer_preferences(corrections)
 
     def _mock_infer_preferences(self, corrections: list[dict]) -> list[Preference]:
@@ -179,33 +227,40 @@ class PreferenceEngine:
 
     async def save_preference(self, preference: Preference) -> dict:
         """好みをDBに保存"""
-        client = get_supabase_client()
-
-        data = {
-            "description": preference.description,
-            "category": preference.category,
-            "scope": preference.scope,
-            "section_type": preference.section_type,
-            "project_id": preference.project_id,
-            "confidence": preference.confidence,
-            "source_corrections": preference.source_corrections,
-            "is_active": preference.is_active,
-            "prompt_version": preference.prompt_version,
-        }
+        client = self._client
+
+        # フィールドの手書きコピーはモデル追従漏れの温床なのでmodel_dumpで一括
+        data = preference.model_dump(exclude={"preference_id"})
 
         result = client.table("preferences").insert(data).execute()
+        self._invalidate_caches()
         return result.data[0] if result.data else {}
 
+    async def save_preferences(self, preferences: list[Preference]) -> list[dict]:
+        """複数の好みを一括でDBに保存（N回のINSERTを1回にまとめる）"""
+        if not preferences:
+            return []
+
+        client = self._client
+
+        rows = [p.model_dump(exclude={"preference_id"}) for p in preferences]
+
+        result = client.table("preferences").insert(rows).execute()
+        self._invalidate_caches()
+        return result.data or []
+
     async def get_preferences(
         self,
         scope: str | None = None,
         category: str | None = None,
         section_type: str | None = None,
+        project_id: str | None = None,
         min_confidence: float = 0.0,
         active_only: bool = True,
+        order_by: str = "confidence",
     ) -> list[dict]:
         """好みを取得"""
-        client = get_supabase_client()
+        client = self._client
 
         query = client.table("preferences").select("*")
 
@@ -215,12 +270,14 @@ class PreferenceEngine:
             query = query.eq("category", category)
         if section_type:
             query = query.eq("section_type", section_type)
+        if project_id:
+            query = query.eq("project_id", project_id)
         if min_confidence > 0:
             query = query.gte("confidence", min_confidence)
         if active_only:
             query = query.eq("is_active", True)
 
-        query = query.order("confidence", desc=True)
+        query = query.order(order_by, desc=True)
 
         result = query.execute()
         return result.data or []
@@ -230,63 +287,44 @@ class PreferenceEngine:
         section_type: str | None = None,
         project_id: UUID | None = None,
     ) -> list[dict]:
-        """適用可能な好みを優先度順で取得"""
-        client = get_supabase_client()
-
-        # 4段階のヒエラルキーで取得
-        all_prefs = []
+        """適用可能な好みを優先度順で取得
+
+        4段階のヒエラルキー（グローバル/プロジェクト/セクションタイプ/個別）を
+        1つのOR条件にまとめ、1往復で取得する。ソートもPostgres側で行う。
+        1本の動画生成中はセクションごとに同じクエリが連発されるため、
+        結果を短いTTLでキャッシュする（好みの書き込みで即無効化）。
+        """
+        cache_key = (str(project_id) if project_id else None, section_type)
+        cached = self._applicable_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < self.APPLICABLE_CACHE_TTL:
+            return cached[1]
+
+        client = self._client
+
+        # 引数に応じて該当するスコープ条件だけを組み立てる
+        conditions = ["scope.eq.global"]
+        if project_id:
+            conditions.append(f"and(scope.eq.project,project_id.eq.{project_id})")
+        if section_type:
+            conditions.append(f"and(scope.eq.section_type,section_type.eq.{section_type})")
+        if project_id and section_type:
+            conditions.append(
+                f"and(scope.eq.specific,project_id.eq.{project_id},"
+                f"section_type.eq.{section_type})"
+            )
 
-        # 1. グローバル
-        global_result = (
+        result = (
             client.table("preferences")
             .select("*")
-            .eq("scope", "global")
             .eq("is_active", True)
+            .or_(",".join(conditions))
+            .order("confidence", desc=True)
             .execute()
         )
-        all_prefs.extend(global_result.data or [])
 
-        # 2. プロジェクト
-        if project_id:
-            project_result = (
-                client.table("preferences")
-                .select("*")
-                .eq("scope", "project")
-                .eq("project_id", str(project_id))
-                .eq("is_active", True)
-                .execute()
-            )
-            all_prefs.extend(project_result.data or [])
-
-        # 3. セクションタイプ
-        if section_type:
-            type_result = (
-                client.table("preferences")
-                .select("*")
-                .eq("scope", "section_type")
-                .eq("section_type", section_type)
-                .eq("is_active", True)
-                .execute()
-            )
-            all_prefs.extend(type_result.data or [])
-
-        # 4. 個別（プロジェクト + セクションタイプ）
-        if project_id and section_type:
-            specific_result = (
-                client.table("preferences")
-                .select("*")
-                .eq("scope", "specific")
-                .eq("project_id", str(project_id))
-                .eq("section_type", section_type)
-                .eq("is_active", True)
-                .execute()
-            )
-            all_prefs.extend(specific_result.data or [])
-
-        # 確信度でソート
-        all_prefs.sort(key=lambda x: x.get("confidence", 0), reverse=True)
-
-        return all_prefs
+        prefs = result.data or []
+        self._applicable_cache[cache_key] = (time.monotonic(), prefs)
+        return prefs
 
     async def update_preference(
         self,
@@ -294,7 +332,7 @@ class PreferenceEngine:
         updates: dict,
     ) -> dict:
         """好みを更新"""
-        client = get_supabase_client()
+        client = self._client
 
         result = (
             client.table("preferences")
@@ -303,11 +341,12 @@ class PreferenceEngine:
             .execute()
         )
 
+        self._invalidate_caches()
         return result.data[0] if result.data else {}
 
     async def deactivate_preference(self, preference_id: UUID) -> bool:
         """好みを無効化"""
-        client = get_supabase_client()
+        client = self._client
 
         result = (
             client.table("preferences")
@@ -316,10 +355,38 @@ class PreferenceEngine:
             .execute()
         )
 
+        self._invalidate_caches()
         return bool(result.data)
 
     async def get_preference_profile(self) -> dict:
-        """ユーザーの好みプロファイルを取得"""
+        """ユーザーの好みプロファイルを取得（書き込みまでキャッシュ）
+
+        集計済みのマテリアライズドビュー（preference_profile）を優先して
+        1行だけ取得し、ビューが未作成などで失敗した場合は従来どおり
+        Python側で集計する。
+        """
+        if self._profile_cache is not None:
+            return self._profile_cache
+
+        try:
+            result = (
+                self._client.table("preference_profile")
+                .select("profile")
+                .single()
+                .execute()
+            )
+            if result.data and result.data.get("profile"):
+                self._profile_cache = result.data["profile"]
+                return self._profile_cache
+        except Exception:
+            pass
+
+        profile = await self._build_preference_profile()
+        self._profile_cache = profile
+        return profile
+
+    async def _build_preference_profile(self) -> dict:
+        """好みプロファイルをPython側で集計（ビューが使えない場合のフォールバック）"""
         prefs = await self.get_preferences(active_only=True, min_confidence=0.5)
 
         profile = {
@@ -1,9 +1,14 @@
 """プロンプト進化エンジン"""
 
+import asyncio
 from uuid import UUID
 
 from ai_video_gen.config import settings
-from ai_video_gen.feedback.preference_engine import preference_engine
+from ai_video_gen.feedback.preference_engine import (
+    SILENT_APPLY_THRESHOLD,
+    SUGGEST_THRESHOLD,
+    preference_engine,
+)
 
 
 class PromptEvolver:
@@ -28,7 +33,7 @@ class PromptEvolver:
         # 確信度が閾値以上の好みのみ適用
         high_confidence_prefs = [
             p for p in preferences
-            if p.get("confidence", 0) >= preference_engine.SILENT_APPLY_THRESHOLD
+            if p.get("confidence", 0) >= SILENT_APPLY_THRESHOLD
         ]
 
         if not high_confidence_prefs:
@@ -62,7 +67,7 @@ class PromptEvolver:
         style_prefs = [
             p for p in preferences
             if p.get("category") == "style"
-            and p.get("confidence", 0) >= preference_engine.SILENT_APPLY_THRESHOLD
+            and p.get("confidence", 0) >= SILENT_APPLY_THRESHOLD
         ]
 
         if not style_prefs:
@@ -92,7 +97,7 @@ class PromptEvolver:
         content_prefs = [
             p for p in preferences
             if p.get("category") in ("content", "style")
-            and p.get("confidence", 0) >= preference_engine.SILENT_APPLY_THRESHOLD
+            and p.get("confidence", 0) >= SILENT_APPLY_THRESHOLD
         ]
 
         if not content_prefs:
@@ -111,16 +116,16 @@ class PromptEvolver:
     def _format_preferences_as_instructions(self, preferences: list[dict]) -> str:
         """好みを指示文として整形"""
         lines = []
+        append = lines.append  # ループ内のメソッド解決を省く
         for pref in preferences:
             desc = pref.get("description", "")
             confidence = pref.get("confidence", 0)
-            scope = pref.get("scope", "global")
             section_type = pref.get("section_type")
 
             if section_type:
-                lines.append(f"- [{section_type}] {desc} (確信度: {confidence:.0%})")
+                append(f"- [{section_type}] {desc} (確信度: {confidence:.0%})")
             else:
-                lines.append(f"- {desc} (確信度: {confidence:.0%})")
+                append(f"- {desc} (確信度: {confidence:.0%})")
 
         return "\n".join(lines)
 
@@ -134,43 +139,57 @@ class PromptEvolver:
             project_id=project_id,
         )
 
-        # 提案レベルの好みを取得
-        suggestions_prefs = [
-            p for p in preferences
-            if preference_engine.SUGGEST_THRESHOLD
-            <= p.get("confidence", 0)
-            < preference_engine.SILENT_APPLY_THRESHOLD
-        ]
-
-        suggestions = []
-        for pref in suggestions_prefs:
-            suggestions.append({
+        # 提案レベルの好みだけを1パスで辞書化する（中間リストを作らない）
+        return [
+            {
                 "preference_id": pref.get("preference_id"),
                 "description": pref.get("description"),
                 "confidence": pref.get("confidence"),
                 "category": pref.get("category"),
                 "action": f"この好みをプロンプトに追加: {pref.get('description')}",
-            })
+            }
+            for pref in preferences
+            if SUGGEST_THRESHOLD <= pref.get("confidence", 0) < SILENT_APPLY_THRESHOLD
+        ]
 
-        return suggestions
+    async def evolve_all_prompts(
+        self,
+        script_prompt: str,
+        visual_prompt: str,
+        narration_prompt: str,
+        section_type: str | None = None,
+        project_id: UUID | None = None,
+    ) -> tuple[str, str, str]:
+        """脚本・ビジュアル・ナレーションのプロンプトをまとめて進化させる
+
+        3つの進化は互いに独立なので、Supabaseへの問い合わせを
+        asyncio.gatherで並行に発行して往復レイテンシの積み上げを避ける。
+        """
+        evolved = await asyncio.gather(
+            self.evolve_script_prompt(script_prompt, section_type, project_id),
+            self.evolve_visual_prompt(visual_prompt, section_type, project_id),
+            self.evolve_narration_prompt(narration_prompt, project_id),
+        )
+        return tuple(evolved)
 
     async def get_evolution_history(self, project_id: UUID) -> list[dict]:
         """プロンプト進化履歴を取得"""
-        # 好みのprompt_versionを追跡
-        preferences = await preference_engine.get_preferences()
+        # プロジェクトの絞り込みと新しい順ソートはDB側で行う
+        preferences = await preference_engine.get_preferences(
+            project_id=str(project_id),
+            order_by="created_at",
+        )
 
-        history = []
-        for pref in preferences:
-            if pref.get("project_id") == str(project_id):
-                history.append({
-                    "preference_id": pref.get("preference_id"),
-                    "description": pref.get("description"),
-                    "prompt_version": pref.get("prompt_version", 1),
-                    "confidence": pref.get("confidence"),
-                    "created_at": pref.get("created_at"),
-                })
-
-        return sorted(history, key=lambda x: x.get("created_at", ""), reverse=True)
+        return [
+            {
+                "preference_id": pref.get("preference_id"),
+                "description": pref.get("description"),
+                "prompt_version": pref.get("prompt_version", 1),
+                "confidence": pref.get("confidence"),
+                "created_at": pref.get("created_at"),
+            }
+            for pref in preferences
+        ]
 
     async def create_personalized_system_prompt(
         self,
@@ -1,11 +1,19 @@
 """Gemini Visionによるビジュアル差分分析"""
 
+import asyncio
 import base64
-import json
+import re
+import time
+from collections import OrderedDict
+from hashlib import sha256
 
-from pydantic import BaseModel
+import httpx
+import orjson
+from pydantic import BaseModel, ConfigDict
 
 from ai_video_gen.config import settings
+from ai_video_gen.feedback import llm_cache
+from ai_video_gen.services.http import get_http_client, post_with_retries
 
 
 VISUAL_DIFF_PROMPT = """
@@ -30,8 +38,88 @@ JSON形式で出力:
 """
 
 
+# LLM出力からJSONオブジェクトを切り出すための事前コンパイル済み正規表現
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# URL由来の画像のbase64キャッシュ（同じ元画像が複数の編集と比較される）
+_url_image_cache: OrderedDict[str, dict] = OrderedDict()
+_URL_IMAGE_CACHE_MAX = 32
+
+# dHash同士のハミング距離がこの値未満なら「見た目に変化なし」とみなす
+_DHASH_IDENTICAL_THRESHOLD = 4
+
+# Gemini Files APIへアップロード済みの画像URI（SHA-256キー、値は
+# (URI, アップロード時刻)）。同じ画像を毎回inline base64で送り直すと
+# ペイロードが33%膨らむため、一度アップロードしてURI参照に切り替える。
+# Files APIのアップロードは約48時間で自動削除されるので、期限切れの
+# URIを送らないよう1時間前倒しの47時間でミス扱いにする
+_file_uri_cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+_FILE_URI_CACHE_MAX = 64
+_FILE_URI_TTL_SECONDS = 47 * 3600
+
+
+def _evict_file_uri(data_b64: str) -> None:
+    """画像に対応するアップロード済みURIをキャッシュから外す
+
+    generateContentが失敗した場合、原因がURIの期限切れでも別要因でも
+    残しておく価値はないため、呼び出し側が失敗時に使う。
+    """
+    _file_uri_cache.pop(sha256(data_b64.encode()).hexdigest(), None)
+
+
+def _inline_part(image_data: dict) -> dict:
+    """inline base64形式の画像パートを構築"""
+    return {
+        "inline_data": {
+            "mime_type": image_data["mime_type"],
+            "data": image_data["data"],
+        }
+    }
+
+
+def _dhash(image_b64: str) -> int | None:
+    """64ビットのdHash（difference hash）を計算
+
+    9x8のグレースケールに縮小し、隣接ピクセルの明暗比較でビットを立てる。
+    計算はサブミリ秒で、Gemini Vision呼び出し（数秒）のスキップ判定に使う。
+    デコードできない画像はNoneを返してスキップ判定を諦める。
+    """
+    import io
+
+    try:
+        from PIL import Image
+
+        raw = base64.b64decode(image_b64)
+        img = Image.open(io.BytesIO(raw)).convert("L").resize((9, 8))
+        pixels = list(img.getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _parse_data_url(image: str) -> tuple[str, str]:
+    """data URLを(mime_type, base64データ)に分解
+
+    split1回の軽い処理なのでメモ化はしない（MB級のdata URL文字列を
+    キーごと保持するとキャッシュだけで数百MBに膨らむ）。同一ペアの
+    再分析はdHashの短絡とLLMレスポンスキャッシュが既に受け持つ。
+    """
+    parts = image.split(",", 1)
+    mime_type = parts[0].split(":")[1].split(";")[0]
+    return mime_type, parts[1]
+
+
 class VisualChange(BaseModel):
     """ビジュアル変更"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     aspect: str
     before: str
     after: str
@@ -40,6 +128,8 @@ class VisualChange(BaseModel):
 
 class VisualDiffResult(BaseModel):
     """ビジュアル差分結果"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     changes: list[VisualChange]
     overall_preference: str
 
@@ -54,82 +144,192 @@ class VisualDiffAnalyzer:
         self,
         original_image: str,
         edited_image: str,
+        use_cache: bool = True,
     ) -> VisualDiffResult:
         """2つの画像の差分を分析"""
         if not self.api_key:
             # モックモード
             return self._mock_diff_result()
 
-        import httpx
-
         # 画像データを準備
-        original_data = self._prepare_image_data(original_image)
-        edited_data = self._prepare_image_data(edited_image)
+        original_data = await self._prepare_image_data(original_image)
+        edited_data = await self._prepare_image_data(edited_image)
+
+        # 見た目が同一（再アップロード・無編集保存など）ならAPIを呼ばない
+        original_hash = _dhash(original_data["data"])
+        edited_hash = _dhash(edited_data["data"])
+        if (
+            original_hash is not None
+            and edited_hash is not None
+            and (original_hash ^ edited_hash).bit_count() < _DHASH_IDENTICAL_THRESHOLD
+        ):
+            return VisualDiffResult(changes=[], overall_preference="目立った変更なし")
+
+        # 同一画像ペアの再分析はディスクキャッシュから返す
+        cache_key = llm_cache.make_key(
+            "visual_diff", original_data["data"], edited_data["data"]
+        )
+        if use_cache:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return VisualDiffResult(**cached)
+
+        # 画像はFiles APIのURI参照で送る（アップロードは2枚並行）
+        original_part, edited_part = await asyncio.gather(
+            self._image_part(original_data),
+            self._image_part(edited_data),
+        )
+
+        # Gemini Vision APIを呼び出し（共有プールクライアント + 再試行付き）
+        response = await self._generate_content(
+            [{"text": VISUAL_DIFF_PROMPT}, original_part, edited_part], 1024
+        )
+
+        if response.status_code != 200 and (
+            "file_data" in original_part or "file_data" in edited_part
+        ):
+            # Files APIのアップロードは約48hで自動削除されるため、
+            # URI参照の失敗は期限切れの可能性がある。キャッシュから外し、
+            # inline base64で1回だけやり直す
+            _evict_file_uri(original_data["data"])
+            _evict_file_uri(edited_data["data"])
+            response = await self._generate_content(
+                [
+                    {"text": VISUAL_DIFF_PROMPT},
+                    _inline_part(original_data),
+                    _inline_part(edited_data),
+                ],
+                1024,
+            )
 
-        # Gemini Vision APIを呼び出し
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        if response.status_code != 200:
+            raise RuntimeError(f"Gemini Vision API error: {response.text}")
+
+        result = response.json()
+        text = result["candidates"][0]["content"]["parts"][0]["text"]
+
+        # JSONを抽出してパース
+        diff_result = self._parse_diff_result(text)
+        if use_cache:
+            await llm_cache.set(cache_key, diff_result.model_dump())
+        return diff_result
+
+    async def _upload_to_gemini(self, data_b64: str, mime_type: str) -> str | None:
+        """画像をGemini Files APIへアップロードしてURIを返す
+
+        同一画像（SHA-256が一致）は再アップロードせずキャッシュ済みURIを返す。
+        アップロードに失敗した場合はNoneを返し、呼び出し側はinline_dataに
+        フォールバックする。
+        """
+        key = sha256(data_b64.encode()).hexdigest()
+        entry = _file_uri_cache.get(key)
+        if entry is not None:
+            uri, uploaded_at = entry
+            if time.time() - uploaded_at < _FILE_URI_TTL_SECONDS:
+                _file_uri_cache.move_to_end(key)
+                return uri
+            # TTL超過：Files API側で削除済みの可能性が高いので再アップロード
+            del _file_uri_cache[key]
+
+        client = await get_http_client()
+        try:
             response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={self.api_key}",
-                json={
-                    "contents": [
-                        {
-                            "parts": [
-                                {"text": VISUAL_DIFF_PROMPT},
-                                {
-                                    "inline_data": {
-                                        "mime_type": original_data["mime_type"],
-                                        "data": original_data["data"],
-                                    }
-                                },
-                                {
-                                    "inline_data": {
-                                        "mime_type": edited_data["mime_type"],
-                                        "data": edited_data["data"],
-                                    }
-                                },
-                            ]
-                        }
-                    ],
-                    "generationConfig": {
-                        "temperature": 0.3,
-                        "maxOutputTokens": 1024,
-                    },
+                f"https://generativelanguage.googleapis.com/upload/v1beta/files?key={self.api_key}",
+                headers={
+                    "X-Goog-Upload-Protocol": "raw",
+                    "Content-Type": mime_type,
                 },
+                content=base64.b64decode(data_b64),
             )
+        except httpx.HTTPError:
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        uri = response.json().get("file", {}).get("uri")
+        if uri:
+            _file_uri_cache[key] = (uri, time.time())
+            if len(_file_uri_cache) > _FILE_URI_CACHE_MAX:
+                _file_uri_cache.popitem(last=False)
+        return uri
+
+    async def _image_part(self, image_data: dict) -> dict:
+        """Gemini APIリクエスト用の画像パートを構築
+
+        Files APIへのアップロードが成功すれば軽量なfile_data参照、
+        失敗すれば従来どおりinline base64を使う。
+        """
+        uri = await self._upload_to_gemini(image_data["data"], image_data["mime_type"])
+        if uri:
+            return {"file_data": {"mime_type": image_data["mime_type"], "file_uri": uri}}
+        return _inline_part(image_data)
+
+    async def _generate_content(self, parts: list[dict], max_output_tokens: int):
+        """Gemini Vision generateContentを呼び出す"""
+        return await post_with_retries(
+            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={self.api_key}",
+            json={
+                "contents": [{"parts": parts}],
+                "generationConfig": {
+                    "temperature": 0.3,
+                    "maxOutputTokens": max_output_tokens,
+                },
+            },
+        )
 
-            if response.status_code != 200:
-                raise RuntimeError(f"Gemini Vision API error: {response.text}")
-
-            result = response.json()
-            text = result["candidates"][0]["content"]["parts"][0]["text"]
-
-            # JSONを抽出してパース
-            return self._parse_diff_result(text)
+    async def _prepare_image_data(self, image: str) -> dict:
+        """画像データを準備
 
-    def _prepare_image_data(self, image: str) -> dict:
-        """画像データを準備"""
+        data URLはそのまま分解し、URL（Supabase Storage等）はストリーミングで
+        ダウンロードしながらbase64化する。画像全体の生バイト列とエンコード済み
+        文字列を同時に保持しないのでメモリ圧が下がる。同じ元画像が複数の編集と
+        比較されるため、URL由来の結果は小さなLRUでキャッシュする。
+        """
         if image.startswith("data:"):
-            # data URL形式
-            parts = image.split(",", 1)
-            mime_type = parts[0].split(":")[1].split(";")[0]
-            data = parts[1]
+            # data URL形式（パース結果はメモ化済み）
+            mime_type, data = _parse_data_url(image)
             return {"mime_type": mime_type, "data": data}
-        else:
-            # ファイルパスの場合（Supabase Storage URL等）
-            # 実際にはhttpxでダウンロードが必要
-            return {"mime_type": "image/png", "data": ""}
+
+        cached = _url_image_cache.get(image)
+        if cached is not None:
+            _url_image_cache.move_to_end(image)
+            return cached
+
+        client = await get_http_client()
+        async with client.stream("GET", image) as response:
+            response.raise_for_status()
+            mime_type = response.headers.get("content-type", "image/png").split(";")[0]
+
+            # base64は3バイト単位でしか区切れないため、端数を持ち越しながら
+            # チャンクごとにエンコードする
+            encoded: list[bytes] = []
+            pending = b""
+            async for chunk in response.aiter_bytes(65536):
+                pending += chunk
+                usable = len(pending) - (len(pending) % 3)
+                if usable:
+                    encoded.append(base64.b64encode(pending[:usable]))
+                    pending = pending[usable:]
+            if pending:
+                encoded.append(base64.b64encode(pending))
+
+        result = {"mime_type": mime_type, "data": b"".join(encoded).decode()}
+        _url_image_cache[image] = result
+        if len(_url_image_cache) > _URL_IMAGE_CACHE_MAX:
+            _url_image_cache.popitem(last=False)
+        return result
 
     def _parse_diff_result(self, text: str) -> VisualDiffResult:
         """Geminiの出力をパース"""
-        # JSON部分を抽出
+        # コードフェンスごと正規表現で最初のJSONオブジェクトを切り出し、
+        # orjsonでパースする（stdlib jsonより数倍速い）
         try:
-            # ```json ... ``` を除去
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
+            match = _JSON_OBJECT_RE.search(text)
+            if match is None:
+                return self._mock_diff_result()
 
-            data = json.loads(text.strip())
+            data = orjson.loads(match.group(0))
 
             changes = [
                 VisualChange(
@@ -145,7 +345,7 @@ class VisualDiffAnalyzer:
                 changes=changes,
                 overall_preference=data.get("overall_preference", ""),
             )
-        except (json.JSONDecodeError, KeyError, IndexError):
+        except (orjson.JSONDecodeError, KeyError, IndexError):
             # パースに失敗した場合はモック結果を返す
             return self._mock_diff_result()
 
@@ -169,44 +369,38 @@ class VisualDiffAnalyzer:
             overall_preference="落ち着いた色調でシンプルなレイアウトを好む傾向",
         )
 
-    async def describe_single_image(self, image: str) -> str:
+    async def describe_single_image(self, image: str, use_cache: bool = True) -> str:
         """単一画像の内容を記述"""
         if not self.api_key:
             return "画像の説明（モックモード）: スライド画像"
 
-        import httpx
+        image_data = await self._prepare_image_data(image)
 
-        image_data = self._prepare_image_data(image)
+        cache_key = llm_cache.make_key("describe_image", image_data["data"])
+        if use_cache:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return cached["description"]
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={self.api_key}",
-                json={
-                    "contents": [
-                        {
-                            "parts": [
-                                {"text": "この教育動画用スライド画像の内容を簡潔に日本語で説明してください。"},
-                                {
-                                    "inline_data": {
-                                        "mime_type": image_data["mime_type"],
-                                        "data": image_data["data"],
-                                    }
-                                },
-                            ]
-                        }
-                    ],
-                    "generationConfig": {
-                        "temperature": 0.3,
-                        "maxOutputTokens": 256,
-                    },
-                },
+        prompt = {"text": "この教育動画用スライド画像の内容を簡潔に日本語で説明してください。"}
+        image_part = await self._image_part(image_data)
+        response = await self._generate_content([prompt, image_part], 256)
+
+        if response.status_code != 200 and "file_data" in image_part:
+            # 期限切れURIの可能性。キャッシュから外してinlineで1回やり直す
+            _evict_file_uri(image_data["data"])
+            response = await self._generate_content(
+                [prompt, _inline_part(image_data)], 256
             )
 
-            if response.status_code != 200:
-                return f"画像の説明を取得できませんでした: {response.status_code}"
+        if response.status_code != 200:
+            return f"画像の説明を取得できませんでした: {response.status_code}"
 
-            result = response.json()
-            return result["candidates"][0]["content"]["parts"][0]["text"]
+        result = response.json()
+        description = result["candidates"][0]["content"]["parts"][0]["text"]
+        if use_cache:
+            await llm_cache.set(cache_key, {"description": description})
+        return description
 
 
 # シングルトンインスタンス
@@ -1,18 +1,79 @@
 """FastAPIアプリケーションエントリーポイント"""
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
+from ai_video_gen.api import jobs
 from ai_video_gen.api.router import api_router
 from ai_video_gen.api.ws import router as ws_router
 from ai_video_gen.config import settings
+from ai_video_gen.feedback.correction_store import correction_store
+from ai_video_gen.services.http import close_http_client, get_http_client
+from ai_video_gen.services.supabase import get_supabase_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動・終了時の処理"""
+    # バックグラウンドジョブのワーカープールを起動
+    jobs.start_workers()
+    # 修正ログの一括フラッシャーを起動
+    correction_store.start_flusher()
+    # 接続ウォームアップ：HTTPプールとSupabaseクライアントを起動時に作り、
+    # 初回リクエストにDNS/TLSハンドシェイクのコストを載せない。
+    # 設定エラーも初回呼び出しではなく起動時に表面化する
+    await get_http_client()
+    try:
+        get_supabase_client().table("preferences").select("preference_id").limit(1).execute()
+    except Exception:
+        # 接続情報のないローカル・テスト環境では起動を妨げない
+        pass
+    yield
+    await jobs.stop_workers()
+    # 未書き込みの修正ログを書き出してから終了
+    await correction_store.stop_flusher()
+    # 共有HTTPクライアントを閉じてコネクションを返却
+    await close_http_client()
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """動画ストリーミングを圧縮対象から外すGZipラッパー
+
+    StarletteのGZipMiddlewareはストリーミングレスポンスを
+    minimum_sizeやcontent-typeに関係なく圧縮するため、
+    /compose/streamのMP4配信では縮まないのにCPUとチャンクごとの
+    遅延だけが乗る。該当経路ではAccept-Encodingを落として
+    素通し（identity）にする。
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/compose/stream"):
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value)
+                for name, value in scope["headers"]
+                if name != b"accept-encoding"
+            ]
+        await super().__call__(scope, receive, send)
+
 
 app = FastAPI(
     title="AI Video Generator API",
     description="教育・チュートリアル動画を半自動生成するAPI",
     version="0.1.0",
+    lifespan=lifespan,
+    # JSONシリアライズをorjson（C実装）に統一
+    default_response_class=ORJSONResponse,
 )
 
+# 大きなJSONレスポンス（修正ログ・好み一覧等）をgzip圧縮して転送量を削減
+# （動画ストリーミングは圧縮しない）
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS設定
 app.add_middleware(
     CORSMiddleware,
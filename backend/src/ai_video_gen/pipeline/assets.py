@@ -0,0 +1,34 @@
+"""アセット生成パイプライン（ビジュアル＋ナレーション同時実行）"""
+
+import asyncio
+from uuid import UUID
+
+from ai_video_gen.models import ProjectState
+from ai_video_gen.pipeline.narration import generate_narrations
+from ai_video_gen.pipeline.visuals import generate_visuals
+from ai_video_gen.services.supabase import get_supabase_client
+
+
+async def generate_assets(project_id: UUID) -> dict:
+    """脚本確定後のビジュアルとナレーションをまとめて生成
+
+    スライド描画はCPU寄り、TTSはネットワーク寄りで互いに独立なため、
+    TaskGroupで2ステージを重ねて実行し、直列実行の合計時間を
+    遅い方のステージの時間まで縮める。各ステージ内部のセクション
+    並列化（セマフォ付きgather）はそのまま活きる。
+    """
+    async with asyncio.TaskGroup() as tg:
+        visuals_task = tg.create_task(generate_visuals(project_id))
+        narrations_task = tg.create_task(generate_narrations(project_id))
+
+    # 両ステージがそれぞれ状態を更新するため完了順で最終状態がぶれる。
+    # 合成に進める状態へここで確定させる
+    client = get_supabase_client()
+    client.table("projects").update({
+        "state": ProjectState.NARRATION_DONE.value,
+    }).eq("id", str(project_id)).execute()
+
+    return {
+        "visuals": visuals_task.result(),
+        "narrations": narrations_task.result(),
+    }
@@ -4,37 +4,35 @@ from uuid import UUID
 
 from ai_video_gen.models import ProjectState
 from ai_video_gen.services.ffmpeg import ffmpeg_service
-from ai_video_gen.services.supabase import get_supabase_client
+from ai_video_gen.services.supabase import fetch_project_with_sections, get_supabase_client
+
+# 合成に必要な列だけ射影する（select("*")はdata URL列まで引いて重い）
+_SECTION_COMPOSE_COLS = (
+    "id,section_index,type,duration,slide_image_path,narration_audio_path"
+)
 
 
 async def compose_video(project_id: UUID) -> dict:
     """プロジェクトの動画を合成"""
     client = get_supabase_client()
 
-    # プロジェクト取得
-    project_result = client.table("projects").select("*").eq("id", str(project_id)).execute()
-    if not project_result.data:
+    # プロジェクトとセクションを1回の埋め込みクエリで取得
+    project, sections = fetch_project_with_sections(
+        str(project_id), "state,total_duration", _SECTION_COMPOSE_COLS
+    )
+    if project is None:
         raise ValueError(f"Project not found: {project_id}")
 
-    project = project_result.data[0]
     if project["state"] not in ("narration_done", "composed"):
         raise ValueError("Narration must be generated first")
 
-    # セクション取得
-    sections_result = (
-        client.table("sections")
-        .select("*")
-        .eq("project_id", str(project_id))
-        .order("section_index")
-        .execute()
-    )
-
-    sections = sections_result.data or []
     if not sections:
         raise ValueError("No sections found")
 
-    # 合計時間を計算
-    total_duration = sum(s.get("duration") or 5.0 for s in sections)
+    # ナレーション生成時に非正規化した合計時間を使う（未計算なら合計する）
+    total_duration = project.get("total_duration") or sum(
+        s.get("duration") or 5.0 for s in sections
+    )
 
     # FFmpegが利用可能か確認
     ffmpeg_available = await ffmpeg_service.check_ffmpeg()
@@ -72,33 +70,24 @@ async def compose_video(project_id: UUID) -> dict:
 
 async def get_compose_status(project_id: UUID) -> dict:
     """動画合成の状態を取得"""
-    client = get_supabase_client()
-
-    # プロジェクト取得
-    project_result = client.table("projects").select("*").eq("id", str(project_id)).execute()
-    if not project_result.data:
+    # プロジェクトとセクションを1回の埋め込みクエリで取得
+    project, sections = fetch_project_with_sections(
+        str(project_id), "state,total_duration,updated_at", "duration"
+    )
+    if project is None:
         raise ValueError(f"Project not found: {project_id}")
 
-    project = project_result.data[0]
-
-    # セクション取得
-    sections_result = (
-        client.table("sections")
-        .select("*")
-        .eq("project_id", str(project_id))
-        .order("section_index")
-        .execute()
+    total_duration = project.get("total_duration") or sum(
+        s.get("duration") or 5.0 for s in sections
     )
 
-    sections = sections_result.data or []
-    total_duration = sum(s.get("duration") or 5.0 for s in sections)
-
     # FFmpegが利用可能か確認
     ffmpeg_available = await ffmpeg_service.check_ffmpeg()
 
     return {
         "project_id": str(project_id),
         "state": project["state"],
+        "updated_at": project.get("updated_at"),
         "is_composed": project["state"] == "composed",
         "can_compose": project["state"] in ("narration_done", "composed"),
         "ffmpeg_available": ffmpeg_available,
@@ -1,88 +1,157 @@
 """ナレーション生成パイプライン"""
 
+import asyncio
 import base64
 from uuid import UUID
 
+from ai_video_gen.config import settings
 from ai_video_gen.models import ProjectState
 from ai_video_gen.services.elevenlabs import elevenlabs_service
-from ai_video_gen.services.supabase import get_supabase_client
+from ai_video_gen.services.supabase import (
+    fetch_project_with_sections,
+    get_supabase_client,
+    upload_to_storage_async,
+)
+from ai_video_gen.utils.hashing import merge_stage_hash, narration_hash, parse_stage_hashes
+
+# select("*")はdata URL等の巨大な列まで引いてしまうため、必要な列だけ射影する
+_SECTION_TTS_COLS = (
+    "id,project_id,section_index,type,narration,narration_audio_path,duration,content_hash"
+)
+
+# テキストが前回から変わっていないセクションを示す番兵
+_UNCHANGED = object()
+
+
+async def _store_audio(section_id: str, audio_bytes: bytes) -> str:
+    """音声をSupabase Storageへ保存してURLを返す
+
+    Storageが使えない環境（ローカル・テスト）ではbase64 data URLに
+    フォールバックする。
+    """
+    url = await upload_to_storage_async(
+        "project-narrations", f"{section_id}.mp3", audio_bytes, "audio/mpeg"
+    )
+    if url is not None:
+        return url
+    audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+    return f"data:audio/mpeg;base64,{audio_base64}"
 
 
 async def generate_narrations(project_id: UUID) -> list[dict]:
     """プロジェクトの全セクションのナレーションを生成"""
     client = get_supabase_client()
 
-    # プロジェクト取得
-    project_result = client.table("projects").select("*").eq("id", str(project_id)).execute()
-    if not project_result.data:
+    # プロジェクトとセクションを1回の埋め込みクエリで取得
+    project, sections = fetch_project_with_sections(
+        str(project_id), "state", _SECTION_TTS_COLS
+    )
+    if project is None:
         raise ValueError(f"Project not found: {project_id}")
 
-    project = project_result.data[0]
     if project["state"] == "init":
         raise ValueError("Script must be generated first")
 
-    # セクション取得
-    sections_result = (
-        client.table("sections")
-        .select("*")
-        .eq("project_id", str(project_id))
-        .order("section_index")
-        .execute()
-    )
-
-    sections = sections_result.data or []
-    results = []
+    # フェーズ1: TTSのみを並列実行する。I/O待ちが支配的なので
+    # プランの同時リクエスト上限まで重ね、DB書き込みは混ぜない
+    semaphore = asyncio.Semaphore(settings.elevenlabs_concurrency)
 
-    for section in sections:
+    async def _synthesize_one(section: dict) -> bytes | object | None:
+        narration_text = section.get("narration") or ""
+        if not narration_text:
+            return None
+        # テキストが前回生成時と同じで音声も残っていればTTSを呼ばない
+        stored = parse_stage_hashes(section.get("content_hash"))
+        if (
+            stored.get("narration") == narration_hash(narration_text)
+            and section.get("narration_audio_path")
+        ):
+            return _UNCHANGED
+        async with semaphore:
+            return await elevenlabs_service.generate_speech(narration_text)
+
+    # gatherは渡した順に結果を返すため、section_index順が維持される
+    audio_list = await asyncio.gather(*(_synthesize_one(s) for s in sections))
+
+    # フェーズ2: 音声が出揃ってから更新行を組み立て、1回のupsertで書き込む。
+    # セクションごとのPostgREST往復をなくし、往復回数をO(N)→O(1)にする。
+    # 結果リストは事前確保してappendの再確保を避ける
+    results: list[dict | None] = [None] * len(sections)
+    rows: list[dict] = []
+    for i, (section, audio_bytes) in enumerate(zip(sections, audio_list)):
         narration_text = section.get("narration") or ""
         if not narration_text:
-            results.append({
+            results[i] = {
                 "section_id": section["id"],
                 "section_index": section["section_index"],
                 "status": "skipped",
                 "message": "ナレーションテキストがありません",
-            })
+            }
             continue
 
-        # 音声生成
-        audio_bytes = await elevenlabs_service.generate_speech(narration_text)
-
-        if audio_bytes:
-            # Base64エンコードしてdata URLとして保存
-            audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-            audio_data_url = f"data:audio/mpeg;base64,{audio_base64}"
+        if audio_bytes is _UNCHANGED:
+            # 変更なし: 既存の音声をそのまま使う
+            results[i] = {
+                "section_id": section["id"],
+                "section_index": section["section_index"],
+                "status": "cached",
+                "duration": elevenlabs_service.estimate_duration(narration_text),
+            }
+            continue
 
-            # セクション更新
-            client.table("sections").update({
-                "narration_audio_path": audio_data_url,
-            }).eq("id", section["id"]).execute()
+        # upsertのINSERT側がNOT NULL制約に当たらないよう必須列も含める
+        row = {
+            "id": section["id"],
+            "project_id": section["project_id"],
+            "section_index": section["section_index"],
+            "type": section["type"],
+            "narration_audio_path": section.get("narration_audio_path"),
+            "duration": section.get("duration"),
+        }
 
-            results.append({
+        if audio_bytes:
+            # MP3はStorageへ上げて短いURLだけをDBに保存する
+            # （base64はサイズが33%膨らみ、以後の全セクション取得を重くする）
+            row["narration_audio_path"] = await _store_audio(section["id"], audio_bytes)
+            # 次回の差分判定用にテキストのハッシュを記録
+            row["content_hash"] = merge_stage_hash(
+                section.get("content_hash"), "narration", narration_hash(narration_text)
+            )
+
+            results[i] = {
                 "section_id": section["id"],
                 "section_index": section["section_index"],
                 "status": "generated",
                 "duration": elevenlabs_service.estimate_duration(narration_text),
-            })
+            }
         else:
             # モックモード: 推定時間のみ設定
-            estimated_duration = elevenlabs_service.estimate_duration(narration_text)
-
-            # セクション更新（durationのみ）
-            client.table("sections").update({
-                "duration": estimated_duration,
-            }).eq("id", section["id"]).execute()
+            row["duration"] = elevenlabs_service.estimate_duration(narration_text)
 
-            results.append({
+            results[i] = {
                 "section_id": section["id"],
                 "section_index": section["section_index"],
                 "status": "mock",
-                "duration": estimated_duration,
+                "duration": row["duration"],
                 "message": "APIキー未設定のためモックモード",
-            })
+            }
+
+        rows.append(row)
+
+    if rows:
+        client.table("sections").upsert(rows, on_conflict="id").execute()
+
+    # 合計時間はここで1回だけ計算して非正規化保存する
+    # （合成ステータスの問い合わせごとに全セクションを合計しない）
+    updated_durations = {row["id"]: row["duration"] for row in rows}
+    total_duration = sum(
+        updated_durations.get(s["id"], s.get("duration")) or 5.0 for s in sections
+    )
 
     # プロジェクト状態更新
     client.table("projects").update({
         "state": ProjectState.NARRATION_DONE.value,
+        "total_duration": total_duration,
     }).eq("id", str(project_id)).execute()
 
     return results
@@ -99,7 +168,7 @@ async def regenerate_section_narration(
     # セクション取得
     section_result = (
         client.table("sections")
-        .select("*")
+        .select("id,section_index,narration")
         .eq("id", str(section_id))
         .eq("project_id", str(project_id))
         .execute()
@@ -130,18 +199,17 @@ async def regenerate_section_narration(
     audio_bytes = await elevenlabs_service.generate_speech(narration_text)
 
     if audio_bytes:
-        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-        audio_data_url = f"data:audio/mpeg;base64,{audio_base64}"
+        audio_url = await _store_audio(str(section_id), audio_bytes)
 
         client.table("sections").update({
-            "narration_audio_path": audio_data_url,
+            "narration_audio_path": audio_url,
         }).eq("id", str(section_id)).execute()
 
         return {
             "section_id": str(section_id),
             "section_index": section["section_index"],
             "status": "generated",
-            "audio_url": audio_data_url,
+            "audio_url": audio_url,
             "duration": elevenlabs_service.estimate_duration(narration_text),
         }
     else:
@@ -166,7 +234,7 @@ async def get_section_narration(project_id: UUID, section_id: UUID) -> dict:
 
     section_result = (
         client.table("sections")
-        .select("*")
+        .select("id,section_index,type,narration,narration_audio_path,duration")
         .eq("id", str(section_id))
         .eq("project_id", str(project_id))
         .execute()
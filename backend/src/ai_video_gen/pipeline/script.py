@@ -6,13 +6,70 @@ from ai_video_gen.models import ProjectState, SectionType
 from ai_video_gen.services.claude import claude_service
 from ai_video_gen.services.supabase import get_supabase_client
 
+# 有効なセクションタイプの集合。ループ内でEnum構築の例外機構を使わず
+# set参照1回で判定する
+_VALID_SECTION_TYPES = frozenset(t.value for t in SectionType)
+
+
+def _build_sections_data(project_id: UUID, script: dict) -> list[dict]:
+    """脚本からsectionsテーブルの挿入行を組み立てる
+
+    タイプ判定はset参照、project_idの文字列化はループ外で1回だけ行う。
+    未知のタイプはslideに落とす。
+    """
+    pid = str(project_id)
+    return [
+        {
+            "project_id": pid,
+            "section_index": idx,
+            "type": (
+                section_type
+                if (section_type := section.get("type", "slide")) in _VALID_SECTION_TYPES
+                else "slide"
+            ),
+            "duration": section.get("duration"),
+            "narration": section.get("narration"),
+            "visual_spec": section.get("visual_spec"),
+        }
+        for idx, section in enumerate(script.get("sections", []))
+    ]
+
+
+def _replace_sections(client, project_id: UUID, sections_data: list[dict]) -> None:
+    """セクションを一括で置き換える
+
+    DELETE+INSERTをトランザクションで実行するRPC（replace_sections）を
+    1往復で呼ぶ。途中状態（セクション0件）が他のリーダーから見えない。
+    マイグレーション未適用の環境ではupsert+末尾削除にフォールバックする。
+    """
+    try:
+        client.rpc(
+            "replace_sections",
+            {"p_project_id": str(project_id), "p_sections": sections_data},
+        ).execute()
+        return
+    except Exception:
+        pass
+
+    client.table("sections").upsert(
+        sections_data, on_conflict="project_id,section_index"
+    ).execute()
+    client.table("sections").delete().eq("project_id", str(project_id)).gte(
+        "section_index", len(sections_data)
+    ).execute()
+
 
 async def generate_script(project_id: UUID) -> dict:
     """プロジェクトの脚本を生成"""
     client = get_supabase_client()
 
     # プロジェクト取得
-    result = client.table("projects").select("*").eq("id", str(project_id)).execute()
+    result = (
+        client.table("projects")
+        .select("theme,duration_target")
+        .eq("id", str(project_id))
+        .execute()
+    )
     if not result.data:
         raise ValueError(f"Project not found: {project_id}")
 
@@ -30,29 +87,9 @@ async def generate_script(project_id: UUID) -> dict:
     }).eq("id", str(project_id)).execute()
 
     # セクション作成
-    sections_data = []
-    for idx, section in enumerate(script.get("sections", [])):
-        section_type = section.get("type", "slide")
-        # 有効なセクションタイプか確認
-        try:
-            SectionType(section_type)
-        except ValueError:
-            section_type = "slide"
-
-        sections_data.append({
-            "project_id": str(project_id),
-            "section_index": idx,
-            "type": section_type,
-            "duration": section.get("duration"),
-            "narration": section.get("narration"),
-            "visual_spec": section.get("visual_spec"),
-        })
-
+    sections_data = _build_sections_data(project_id, script)
     if sections_data:
-        # 既存セクションを削除
-        client.table("sections").delete().eq("project_id", str(project_id)).execute()
-        # 新規セクション挿入
-        client.table("sections").insert(sections_data).execute()
+        _replace_sections(client, project_id, sections_data)
 
     return script
 
@@ -71,26 +108,9 @@ async def update_script(project_id: UUID, script: dict) -> dict:
         raise ValueError(f"Project not found: {project_id}")
 
     # セクション更新
-    sections_data = []
-    for idx, section in enumerate(script.get("sections", [])):
-        section_type = section.get("type", "slide")
-        try:
-            SectionType(section_type)
-        except ValueError:
-            section_type = "slide"
-
-        sections_data.append({
-            "project_id": str(project_id),
-            "section_index": idx,
-            "type": section_type,
-            "duration": section.get("duration"),
-            "narration": section.get("narration"),
-            "visual_spec": section.get("visual_spec"),
-        })
-
+    sections_data = _build_sections_data(project_id, script)
     if sections_data:
-        client.table("sections").delete().eq("project_id", str(project_id)).execute()
-        client.table("sections").insert(sections_data).execute()
+        _replace_sections(client, project_id, sections_data)
 
     return script
 
@@ -100,7 +120,7 @@ async def convert_document_to_script(project_id: UUID, document: str, theme: str
     client = get_supabase_client()
 
     # プロジェクト確認
-    result = client.table("projects").select("*").eq("id", str(project_id)).execute()
+    result = client.table("projects").select("id").eq("id", str(project_id)).execute()
     if not result.data:
         raise ValueError(f"Project not found: {project_id}")
 
@@ -114,25 +134,8 @@ async def convert_document_to_script(project_id: UUID, document: str, theme: str
     }).eq("id", str(project_id)).execute()
 
     # セクション作成
-    sections_data = []
-    for idx, section in enumerate(script.get("sections", [])):
-        section_type = section.get("type", "slide")
-        try:
-            SectionType(section_type)
-        except ValueError:
-            section_type = "slide"
-
-        sections_data.append({
-            "project_id": str(project_id),
-            "section_index": idx,
-            "type": section_type,
-            "duration": section.get("duration"),
-            "narration": section.get("narration"),
-            "visual_spec": section.get("visual_spec"),
-        })
-
+    sections_data = _build_sections_data(project_id, script)
     if sections_data:
-        client.table("sections").delete().eq("project_id", str(project_id)).execute()
-        client.table("sections").insert(sections_data).execute()
+        _replace_sections(client, project_id, sections_data)
 
     return script
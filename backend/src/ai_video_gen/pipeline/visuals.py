@@ -1,60 +1,136 @@
 """ビジュアル生成パイプライン"""
 
+import asyncio
+import base64
 from uuid import UUID
 
+from ai_video_gen.config import settings
 from ai_video_gen.models import ProjectState
-from ai_video_gen.services.gemini import gemini_service
-from ai_video_gen.services.slide_renderer import generate_slide_data_url
-from ai_video_gen.services.supabase import get_supabase_client
+from ai_video_gen.services.slide_renderer import render_slide_bytes
+from ai_video_gen.services.supabase import (
+    fetch_project_with_sections,
+    get_supabase_client,
+    upload_to_storage_async,
+)
+from ai_video_gen.utils.hashing import merge_stage_hash, parse_stage_hashes, visual_hash
+
+# select("*")はdata URL等の巨大な列まで引いてしまうため、必要な列だけ射影する
+_SECTION_VISUAL_COLS = (
+    "id,project_id,section_index,type,visual_spec,slide_image_path,content_hash"
+)
+
+
+async def _store_slide(section_id: str, mime_type: str, data: bytes) -> str:
+    """スライドをSupabase Storageへ保存してURLを返す
+
+    レンダリング結果のバイト列をそのままアップロードし、data URLの
+    base64往復（encode→decode）を挟まない。DBには短いURLだけを残す。
+    Storageが使えない環境に限りdata URLへエンコードしてフォールバックする。
+    """
+    ext = "html" if mime_type == "text/html" else "png"
+    url = await upload_to_storage_async(
+        "project-slides",
+        f"{section_id}.{ext}",
+        data,
+        mime_type,
+    )
+    if url is not None:
+        return url
+    encoded = base64.b64encode(data).decode("ascii")
+    return f"data:{mime_type};base64,{encoded}"
 
 
 async def generate_visuals(project_id: UUID) -> list[dict]:
     """プロジェクトの全セクションのビジュアルを生成"""
     client = get_supabase_client()
 
-    # プロジェクト取得
-    project_result = client.table("projects").select("*").eq("id", str(project_id)).execute()
-    if not project_result.data:
+    # プロジェクトとセクションを1回の埋め込みクエリで取得
+    project, sections = fetch_project_with_sections(
+        str(project_id), "state", _SECTION_VISUAL_COLS
+    )
+    if project is None:
         raise ValueError(f"Project not found: {project_id}")
 
-    project = project_result.data[0]
     if project["state"] == "init":
         raise ValueError("Script must be generated first")
 
-    # セクション取得
-    sections_result = (
-        client.table("sections")
-        .select("*")
-        .eq("project_id", str(project_id))
-        .order("section_index")
-        .execute()
-    )
-
-    sections = sections_result.data or []
-    results = []
+    # 画像生成はI/O待ちが支配的なので、API側のクォータに合わせて並列化する
+    semaphore = asyncio.Semaphore(settings.image_gen_concurrency)
 
-    for section in sections:
+    async def _generate_one(section: dict) -> dict:
         visual_spec = section.get("visual_spec") or {}
         section_type = section.get("type", "slide")
 
-        # HTMLスライドを生成（data URL形式）
-        slide_data_url = generate_slide_data_url(visual_spec, section_type)
-
-        # Gemini APIで画像生成を試みる（オプション）
-        # 今回はHTMLベースのスライドをメインとする
-        # image_bytes = await gemini_service.generate_slide_image(visual_spec, section_type)
-
-        # セクション更新（slide_image_pathにdata URLを保存）
-        client.table("sections").update({
-            "slide_image_path": slide_data_url,
-        }).eq("id", section["id"]).execute()
-
-        results.append({
+        # visual_specが前回から変わっておらずスライドも残っていれば再生成しない
+        stored = parse_stage_hashes(section.get("content_hash"))
+        spec_hash = visual_hash(visual_spec)
+        if stored.get("visual") == spec_hash and section.get("slide_image_path"):
+            return {
+                "section_id": section["id"],
+                "section_index": section["section_index"],
+                "type": section_type,
+                "slide_url": section["slide_image_path"],
+                "status": "cached",
+            }
+
+        async with semaphore:
+            # HTMLスライド生成はCPU寄りなのでスレッドへ逃がし、
+            # イベントループを並走中のTTS呼び出しに明け渡す
+            mime_type, slide_bytes = await asyncio.to_thread(
+                render_slide_bytes, visual_spec, section_type
+            )
+
+            # Gemini APIで画像生成を試みる（オプション）
+            # 今回はHTMLベースのスライドをメインとする
+            # image_bytes = await gemini_service.generate_slide_image(visual_spec, section_type)
+
+        return {
             "section_id": section["id"],
             "section_index": section["section_index"],
             "type": section_type,
-            "slide_url": slide_data_url,
-        })
+            "slide_url": await _store_slide(section["id"], mime_type, slide_bytes),
+            "content_hash": merge_stage_hash(
+                section.get("content_hash"), "visual", spec_hash
+            ),
+        }
+
+    # 1セクションの失敗が他を巻き込まないようreturn_exceptionsで回収する
+    gathered = await asyncio.gather(
+        *(_generate_one(s) for s in sections),
+        return_exceptions=True,
+    )
+
+    # 生成が出揃ってから1回のupsertで書き込む（セクションごとの往復をなくす）。
+    # 結果リストは事前確保してappendの再確保を避ける
+    results: list[dict | None] = [None] * len(sections)
+    rows: list[dict] = []
+    for i, (section, outcome) in enumerate(zip(sections, gathered)):
+        if isinstance(outcome, BaseException):
+            results[i] = {
+                "section_id": section["id"],
+                "section_index": section["section_index"],
+                "type": section.get("type", "slide"),
+                "slide_url": None,
+                "status": "error",
+                "message": str(outcome),
+            }
+        elif outcome.get("status") == "cached":
+            # 変更なし: DBへの書き込みも不要
+            results[i] = outcome
+        else:
+            results[i] = outcome
+            # upsertのINSERT側がNOT NULL制約に当たらないよう必須列も含める
+            rows.append({
+                "id": section["id"],
+                "project_id": section["project_id"],
+                "section_index": section["section_index"],
+                "type": section.get("type", "slide"),
+                "slide_image_path": outcome["slide_url"],
+                "content_hash": outcome.pop("content_hash"),
+            })
+
+    if rows:
+        client.table("sections").upsert(rows, on_conflict="id").execute()
 
     # プロジェクト状態更新
     client.table("projects").update({
@@ -75,7 +151,7 @@ async def regenerate_section_visual(
     # セクション取得
     section_result = (
         client.table("sections")
-        .select("*")
+        .select(_SECTION_VISUAL_COLS)
         .eq("id", str(section_id))
         .eq("project_id", str(project_id))
         .execute()
@@ -97,18 +173,19 @@ async def regenerate_section_visual(
     section_type = section.get("type", "slide")
 
     # HTMLスライドを再生成
-    slide_data_url = generate_slide_data_url(visual_spec, section_type)
+    mime_type, slide_bytes = render_slide_bytes(visual_spec, section_type)
+    slide_url = await _store_slide(str(section_id), mime_type, slide_bytes)
 
     # セクション更新
     client.table("sections").update({
-        "slide_image_path": slide_data_url,
+        "slide_image_path": slide_url,
     }).eq("id", str(section_id)).execute()
 
     return {
         "section_id": str(section_id),
         "section_index": section["section_index"],
         "type": section_type,
-        "slide_url": slide_data_url,
+        "slide_url": slide_url,
     }
 
 
@@ -118,7 +195,7 @@ async def get_section_slide(project_id: UUID, section_id: UUID) -> dict:
 
     section_result = (
         client.table("sections")
-        .select("*")
+        .select("id,section_index,type,visual_spec,slide_image_path,narration")
         .eq("id", str(section_id))
         .eq("project_id", str(project_id))
         .execute()
@@ -1,11 +1,20 @@
 """脚本生成サービス（Claude / Gemini 対応）"""
 
-import json
+import logging
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
 from typing import AsyncIterator
 
 import httpx
+import orjson
 
 from ai_video_gen.config import settings
+from ai_video_gen.feedback import llm_cache
+from ai_video_gen.services.http import get_http_client
+
+logger = logging.getLogger(__name__)
 
 # ドキュメント変換プロンプト
 DOCUMENT_CONVERT_PROMPT = """あなたは教育動画の脚本家です。
@@ -127,9 +136,94 @@ SCRIPT_SYSTEM_PROMPT = """あなたは教育動画の脚本家です。
 """
 
 
+# コードフェンス内のJSONを1パスで切り出すための事前コンパイル済み正規表現
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+# モック脚本の骨格はリクエスト間で不変なので、モジュールロード時に1回だけ
+# 構築し、呼び出しごとは{THEME}の差し込みとduration計算のみ行う
+_MOCK_DURATION_FRACTIONS = (0.2, 0.3, 0.25, 0.1)
+
+_MOCK_TEMPLATE = {
+    "title": "{THEME} 入門",
+    "description": "{THEME}について基礎から学ぶチュートリアル動画です。",
+    "sections": [
+        {
+            "type": "title",
+            "duration": 5,
+            "narration": "こんにちは！今日は{THEME}について学んでいきましょう。",
+            "visual_spec": {
+                "title": "{THEME} 入門",
+                "subtitle": "基礎から学ぶチュートリアル",
+            },
+        },
+        {
+            "type": "slide",
+            "duration": None,
+            "narration": "まず、{THEME}とは何かについて説明します。{THEME}は非常に重要な概念で、多くの場面で活用されています。",
+            "visual_spec": {
+                "heading": "{THEME}とは？",
+                "bullets": [
+                    "基本的な概念の説明",
+                    "なぜ重要なのか",
+                    "どのような場面で使われるか",
+                ],
+            },
+        },
+        {
+            "type": "code",
+            "duration": None,
+            "narration": "それでは、実際のコードを見てみましょう。これが{THEME}の基本的な使い方です。",
+            "visual_spec": {
+                "language": "python",
+                "code": "# {THEME}の基本例\nprint('Hello, {THEME}!')\n\n# 変数の定義\nvalue = 42\nprint(f'値: {value}')",
+            },
+        },
+        {
+            "type": "slide",
+            "duration": None,
+            "narration": "{THEME}を使う際のポイントをまとめます。これらを押さえておけば、基本的な使い方はマスターできます。",
+            "visual_spec": {
+                "heading": "ポイント",
+                "bullets": [
+                    "ポイント1: 基本を理解する",
+                    "ポイント2: 実際に手を動かす",
+                    "ポイント3: エラーを恐れない",
+                ],
+            },
+        },
+        {
+            "type": "summary",
+            "duration": None,
+            "narration": "以上で{THEME}の基礎は終わりです。ぜひ実際に試してみてください。ご視聴ありがとうございました！",
+            "visual_spec": {
+                "points": [
+                    "{THEME}の基本を学びました",
+                    "実際のコード例を確認しました",
+                    "次のステップに進む準備ができました",
+                ],
+            },
+        },
+    ],
+}
+
+
+def _fill_mock(node, theme: str):
+    """テンプレートを1パスで歩いて{THEME}を差し込む（新しい構造を返す）"""
+    if isinstance(node, str):
+        return node.replace("{THEME}", theme)
+    if isinstance(node, list):
+        return [_fill_mock(item, theme) for item in node]
+    if isinstance(node, dict):
+        return {key: _fill_mock(value, theme) for key, value in node.items()}
+    return node
+
+
 class ClaudeService:
     """脚本生成サービス（Claude / Gemini 対応）"""
 
+    # 同一入力に対するLLM応答キャッシュの上限件数
+    RESPONSE_CACHE_MAX = 64
+
     def __init__(self):
         self.claude_api_key = settings.anthropic_api_key
         self.gemini_api_key = settings.google_api_key
@@ -137,6 +231,28 @@ class ClaudeService:
         self.gemini_base_url = "https://generativelanguage.googleapis.com/v1beta"
         self.claude_model = "claude-sonnet-4-20250514"
         self.gemini_model = "gemini-2.0-flash"
+        # 入力ハッシュ -> 生成済み脚本。同一テーマの再生成・リトライで
+        # 高価なLLM呼び出しを繰り返さない
+        self._response_cache: OrderedDict[str, dict] = OrderedDict()
+
+    def _cache_get(self, key: str) -> dict | None:
+        """応答キャッシュから取得（LRU順を更新）
+
+        llm_cache_enabled=Falseならインメモリ層も無効化する。
+        プロンプト調整中など、毎回新規生成したい場面の逃げ道。
+        """
+        if not settings.llm_cache_enabled:
+            return None
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            self._response_cache.move_to_end(key)
+        return cached
+
+    def _cache_put(self, key: str, value: dict) -> None:
+        """応答キャッシュに保存（上限超過時は最古を破棄）"""
+        self._response_cache[key] = value
+        if len(self._response_cache) > self.RESPONSE_CACHE_MAX:
+            self._response_cache.popitem(last=False)
 
     @property
     def is_available(self) -> bool:
@@ -157,10 +273,43 @@ class ClaudeService:
         if not self.is_available:
             return self._generate_mock_script(theme, duration_target)
 
+        # モデルもキーに含める（Claude/Geminiの切り替えで衝突しないように）
+        model = self.gemini_model if self.use_gemini else self.claude_model
+        cache_key = sha256(f"script|{model}|{theme}|{duration_target}".encode()).hexdigest()
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 再起動をまたぐディスクキャッシュも確認する
+        disk_cached = await llm_cache.get(cache_key)
+        if disk_cached is not None:
+            self._cache_put(cache_key, disk_cached)
+            return disk_cached
+
         if self.use_gemini:
-            return await self._generate_script_gemini(theme, duration_target)
+            script = await self._generate_script_gemini(theme, duration_target)
         else:
-            return await self._generate_script_claude(theme, duration_target)
+            script = await self._generate_script_claude(theme, duration_target)
+
+        self._cache_put(cache_key, script)
+        await llm_cache.set(cache_key, script)
+        return script
+
+    @staticmethod
+    def _log_cache_usage(result: dict) -> None:
+        """プロンプトキャッシュのヒット状況を出力
+
+        cache_read_input_tokensが伸びていればシステムプロンプトが
+        キャッシュから読まれている（入力コスト約1/10・TTFB短縮）。
+        """
+        usage = result.get("usage") or {}
+        read = usage.get("cache_read_input_tokens")
+        if read is not None:
+            logger.info(
+                "Prompt cache: read=%s created=%s",
+                read,
+                usage.get("cache_creation_input_tokens", 0),
+            )
 
     async def _generate_script_claude(
         self,
@@ -172,27 +321,36 @@ class ClaudeService:
         if duration_target:
             user_prompt += f"\n目標時間: {duration_target}秒"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.claude_base_url}/messages",
-                headers={
-                    "x-api-key": self.claude_api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": self.claude_model,
-                    "max_tokens": 4096,
-                    "system": SCRIPT_SYSTEM_PROMPT,
-                    "messages": [{"role": "user", "content": user_prompt}],
-                },
-                timeout=120.0,
-            )
-            response.raise_for_status()
-            result = response.json()
+        client = await get_http_client()
+        response = await client.post(
+            f"{self.claude_base_url}/messages",
+            headers={
+                "x-api-key": self.claude_api_key,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            json={
+                "model": self.claude_model,
+                "max_tokens": 4096,
+                # 固定のシステムプロンプトはプロンプトキャッシュ対象にする
+                # （2回目以降の呼び出しで入力トークンコストとTTFBが下がる）
+                "system": [
+                    {
+                        "type": "text",
+                        "text": SCRIPT_SYSTEM_PROMPT,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+                "messages": [{"role": "user", "content": user_prompt}],
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        result = response.json()
+        self._log_cache_usage(result)
 
-            content = result["content"][0]["text"]
-            return self._extract_json(content)
+        content = result["content"][0]["text"]
+        return self._extract_json(content)
 
     async def _generate_script_gemini(
         self,
@@ -206,32 +364,39 @@ class ClaudeService:
 
         full_prompt = f"{SCRIPT_SYSTEM_PROMPT}\n\n{user_prompt}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.gemini_base_url}/models/{self.gemini_model}:generateContent",
-                params={"key": self.gemini_api_key},
-                json={
-                    "contents": [{"parts": [{"text": full_prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.5,
-                        "maxOutputTokens": 4096,
-                    },
+        client = await get_http_client()
+        response = await client.post(
+            f"{self.gemini_base_url}/models/{self.gemini_model}:generateContent",
+            params={"key": self.gemini_api_key},
+            json={
+                "contents": [{"parts": [{"text": full_prompt}]}],
+                "generationConfig": {
+                    "temperature": 0.5,
+                    "maxOutputTokens": 4096,
                 },
-                timeout=120.0,
-            )
-            response.raise_for_status()
-            result = response.json()
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            content = result["candidates"][0]["content"]["parts"][0]["text"]
-            return self._extract_json(content)
+        content = result["candidates"][0]["content"]["parts"][0]["text"]
+        return self._extract_json(content)
 
     def _extract_json(self, content: str) -> dict:
-        """レスポンスからJSONを抽出"""
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        return json.loads(content.strip())
+        """レスポンスからJSONを抽出
+
+        str.splitで中間文字列を何度も作る代わりに、正規表現1パスで
+        フェンス内を切り出してorjson（C実装）でパースする。
+        """
+        content = content.strip()
+        # 「JSONのみを出力」指示により大半は素のJSONで返る。
+        # その場合はフェンス探索を丸ごとスキップする
+        if not content.startswith(("{", "[")):
+            match = _JSON_FENCE_RE.search(content)
+            if match:
+                content = match.group(1).strip()
+        return orjson.loads(content)
 
     async def generate_script_stream(
         self,
@@ -242,103 +407,207 @@ class ClaudeService:
         if not self.is_available:
             # モックモード: 段階的に返す
             mock_script = self._generate_mock_script(theme, duration_target)
-            yield json.dumps(mock_script, ensure_ascii=False)
+            yield orjson.dumps(mock_script).decode()
             return
 
-        # Geminiはストリーミング非対応なので通常生成
         if self.use_gemini:
-            script = await self._generate_script_gemini(theme, duration_target)
-            yield json.dumps(script, ensure_ascii=False)
+            async for text in self._generate_script_stream_gemini(
+                theme, duration_target
+            ):
+                yield text
             return
 
         user_prompt = f"テーマ: {theme}"
         if duration_target:
             user_prompt += f"\n目標時間: {duration_target}秒"
 
-        async with httpx.AsyncClient() as client:
+        client = await get_http_client()
+        async with client.stream(
+            "POST",
+            f"{self.claude_base_url}/messages",
+            headers={
+                "x-api-key": self.claude_api_key,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            json={
+                "model": self.claude_model,
+                "max_tokens": 4096,
+                "stream": True,
+                "system": [
+                    {
+                        "type": "text",
+                        "text": SCRIPT_SYSTEM_PROMPT,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+                "messages": [{"role": "user", "content": user_prompt}],
+            },
+            timeout=120.0,
+        ) as response:
+            response.raise_for_status()
+            # aiter_lines()は全行をstrへデコードするが、SSEのフレーミングは
+            # ASCIIなのでバイト列のままイベント境界（空行）で区切る。
+            # content_block_delta以外のイベントはパースせずに捨てる
+            buf = bytearray()
+            async for chunk in response.aiter_bytes():
+                buf += chunk
+                while True:
+                    boundary = buf.find(b"\n\n")
+                    if boundary < 0:
+                        break
+                    # イベント全体のbytesコピーは作らず、バッファ内を
+                    # 範囲指定で直接探してdataペイロードだけ切り出す
+                    if buf.find(b'"content_block_delta"', 0, boundary) >= 0:
+                        start = buf.find(b"data: ", 0, boundary)
+                        if start >= 0:
+                            data = orjson.loads(bytes(buf[start + 6 : boundary]))
+                            if data["type"] == "content_block_delta":
+                                yield data["delta"].get("text", "")
+                    del buf[: boundary + 2]
+
+    async def _generate_script_stream_gemini(
+        self,
+        theme: str,
+        duration_target: float | None = None,
+    ) -> AsyncIterator[str]:
+        """Gemini APIで脚本をストリーミング生成
+
+        streamGenerateContent(alt=sse)で逐次受信し、Claude側と同じ
+        バイトレベルのSSE分割でテキスト片をyieldする。最初のチャンクが
+        届く前に失敗した場合は一括生成にフォールバックする。
+        """
+        user_prompt = f"テーマ: {theme}"
+        if duration_target:
+            user_prompt += f"\n目標時間: {duration_target}秒"
+        full_prompt = f"{SCRIPT_SYSTEM_PROMPT}\n\n{user_prompt}"
+
+        client = await get_http_client()
+        yielded = False
+        try:
             async with client.stream(
                 "POST",
-                f"{self.claude_base_url}/messages",
-                headers={
-                    "x-api-key": self.claude_api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
+                f"{self.gemini_base_url}/models/{self.gemini_model}"
+                ":streamGenerateContent",
+                params={"key": self.gemini_api_key, "alt": "sse"},
                 json={
-                    "model": self.claude_model,
-                    "max_tokens": 4096,
-                    "stream": True,
-                    "system": SCRIPT_SYSTEM_PROMPT,
-                    "messages": [{"role": "user", "content": user_prompt}],
+                    "contents": [{"parts": [{"text": full_prompt}]}],
+                    "generationConfig": {
+                        "temperature": 0.5,
+                        "maxOutputTokens": 4096,
+                    },
                 },
                 timeout=120.0,
             ) as response:
                 response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        if data["type"] == "content_block_delta":
-                            yield data["delta"].get("text", "")
+                buf = bytearray()
+                async for chunk in response.aiter_bytes():
+                    buf += chunk
+                    while True:
+                        boundary = buf.find(b"\n\n")
+                        if boundary < 0:
+                            break
+                        start = buf.find(b"data: ", 0, boundary)
+                        if start >= 0:
+                            data = orjson.loads(bytes(buf[start + 6 : boundary]))
+                            candidates = data.get("candidates") or []
+                            if candidates:
+                                parts = candidates[0].get("content", {}).get(
+                                    "parts", []
+                                )
+                                for part in parts:
+                                    text = part.get("text")
+                                    if text:
+                                        yielded = True
+                                        yield text
+                        del buf[: boundary + 2]
+        except httpx.HTTPError:
+            # ストリーミングエンドポイントが使えない環境向けの保険
+            if not yielded:
+                script = await self._generate_script_gemini(theme, duration_target)
+                yield orjson.dumps(script).decode()
 
     async def convert_document(self, document: str, theme: str) -> dict:
         """ドキュメントをナレーション形式の脚本に変換"""
         if not self.is_available:
             return self._generate_mock_script_from_document(document, theme)
 
+        model = self.gemini_model if self.use_gemini else self.claude_model
+        cache_key = sha256(f"document|{model}|{theme}|{document}".encode()).hexdigest()
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        disk_cached = await llm_cache.get(cache_key)
+        if disk_cached is not None:
+            self._cache_put(cache_key, disk_cached)
+            return disk_cached
+
         if self.use_gemini:
-            return await self._convert_document_gemini(document, theme)
+            script = await self._convert_document_gemini(document, theme)
         else:
-            return await self._convert_document_claude(document, theme)
+            script = await self._convert_document_claude(document, theme)
+
+        self._cache_put(cache_key, script)
+        await llm_cache.set(cache_key, script)
+        return script
 
     async def _convert_document_claude(self, document: str, theme: str) -> dict:
         """Claude APIでドキュメントを脚本に変換"""
         user_prompt = f"テーマ: {theme}\n\n以下のドキュメントを脚本に変換してください:\n\n{document}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.claude_base_url}/messages",
-                headers={
-                    "x-api-key": self.claude_api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": self.claude_model,
-                    "max_tokens": 4096,
-                    "system": DOCUMENT_CONVERT_PROMPT,
-                    "messages": [{"role": "user", "content": user_prompt}],
-                },
-                timeout=120.0,
-            )
-            response.raise_for_status()
-            result = response.json()
+        client = await get_http_client()
+        response = await client.post(
+            f"{self.claude_base_url}/messages",
+            headers={
+                "x-api-key": self.claude_api_key,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            json={
+                "model": self.claude_model,
+                "max_tokens": 4096,
+                "system": [
+                    {
+                        "type": "text",
+                        "text": DOCUMENT_CONVERT_PROMPT,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+                "messages": [{"role": "user", "content": user_prompt}],
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        result = response.json()
+        self._log_cache_usage(result)
 
-            content = result["content"][0]["text"]
-            return self._extract_json(content)
+        content = result["content"][0]["text"]
+        return self._extract_json(content)
 
     async def _convert_document_gemini(self, document: str, theme: str) -> dict:
         """Gemini APIでドキュメントを脚本に変換"""
         user_prompt = f"テーマ: {theme}\n\n以下のドキュメントを脚本に変換してください:\n\n{document}"
         full_prompt = f"{DOCUMENT_CONVERT_PROMPT}\n\n{user_prompt}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.gemini_base_url}/models/{self.gemini_model}:generateContent",
-                params={"key": self.gemini_api_key},
-                json={
-                    "contents": [{"parts": [{"text": full_prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.3,
-                        "maxOutputTokens": 4096,
-                    },
+        client = await get_http_client()
+        response = await client.post(
+            f"{self.gemini_base_url}/models/{self.gemini_model}:generateContent",
+            params={"key": self.gemini_api_key},
+            json={
+                "contents": [{"parts": [{"text": full_prompt}]}],
+                "generationConfig": {
+                    "temperature": 0.3,
+                    "maxOutputTokens": 4096,
                 },
-                timeout=120.0,
-            )
-            response.raise_for_status()
-            result = response.json()
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            content = result["candidates"][0]["content"]["parts"][0]["text"]
-            return self._extract_json(content)
+        content = result["candidates"][0]["content"]["parts"][0]["text"]
+        return self._extract_json(content)
 
     def _generate_mock_script_from_document(self, document: str, theme: str) -> dict:
         """モック脚本を生成（ドキュメントベース）"""
@@ -389,71 +658,27 @@ class ClaudeService:
         theme: str,
         duration_target: float | None = None,
     ) -> dict:
-        """モック脚本を生成（APIキーがない場合）"""
-        target = duration_target or 180
-
-        return {
-            "title": f"{theme} 入門",
-            "description": f"{theme}について基礎から学ぶチュートリアル動画です。",
-            "sections": [
-                {
-                    "type": "title",
-                    "duration": 5,
-                    "narration": f"こんにちは！今日は{theme}について学んでいきましょう。",
-                    "visual_spec": {
-                        "title": f"{theme} 入門",
-                        "subtitle": "基礎から学ぶチュートリアル",
-                    },
-                },
-                {
-                    "type": "slide",
-                    "duration": int(target * 0.2),
-                    "narration": f"まず、{theme}とは何かについて説明します。{theme}は非常に重要な概念で、多くの場面で活用されています。",
-                    "visual_spec": {
-                        "heading": f"{theme}とは？",
-                        "bullets": [
-                            "基本的な概念の説明",
-                            "なぜ重要なのか",
-                            "どのような場面で使われるか",
-                        ],
-                    },
-                },
-                {
-                    "type": "code",
-                    "duration": int(target * 0.3),
-                    "narration": f"それでは、実際のコードを見てみましょう。これが{theme}の基本的な使い方です。",
-                    "visual_spec": {
-                        "language": "python",
-                        "code": f"# {theme}の基本例\nprint('Hello, {theme}!')\n\n# 変数の定義\nvalue = 42\nprint(f'値: {{value}}')",
-                    },
-                },
-                {
-                    "type": "slide",
-                    "duration": int(target * 0.25),
-                    "narration": f"{theme}を使う際のポイントをまとめます。これらを押さえておけば、基本的な使い方はマスターできます。",
-                    "visual_spec": {
-                        "heading": "ポイント",
-                        "bullets": [
-                            "ポイント1: 基本を理解する",
-                            "ポイント2: 実際に手を動かす",
-                            "ポイント3: エラーを恐れない",
-                        ],
-                    },
-                },
-                {
-                    "type": "summary",
-                    "duration": int(target * 0.1),
-                    "narration": f"以上で{theme}の基礎は終わりです。ぜひ実際に試してみてください。ご視聴ありがとうございました！",
-                    "visual_spec": {
-                        "points": [
-                            f"{theme}の基本を学びました",
-                            "実際のコード例を確認しました",
-                            "次のステップに進む準備ができました",
-                        ],
-                    },
-                },
-            ],
-        }
+        """モック脚本を生成（APIキーがない場合）
+
+        構造は不変なのでモジュールレベルのテンプレートにテーマを差し込み、
+        可変のdurationだけ目標時間から計算する。
+        """
+        return _build_mock_script(theme, duration_target or 180)
+
+
+@lru_cache(maxsize=128)
+def _build_mock_script(theme: str, target: float) -> dict:
+    """(テーマ, 目標時間)ごとのモック脚本を組み立ててメモ化
+
+    モックモードのロードテストやローカル開発で同じ引数が繰り返し
+    来るため、テンプレート展開と文字列生成を初回だけ行う。
+    応答キャッシュ同様、返る辞書は共有オブジェクトとして扱う。
+    """
+    script = _fill_mock(_MOCK_TEMPLATE, theme)
+    durations = [int(target * fraction) for fraction in _MOCK_DURATION_FRACTIONS]
+    for section, duration in zip(script["sections"][1:], durations):
+        section["duration"] = duration
+    return script
 
 
 # シングルトンインスタンス
@@ -1,10 +1,29 @@
 """ElevenLabs API サービス（ナレーション音声生成）"""
 
+import asyncio
+import logging
+import random
 import re
+import time
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
 
 import httpx
 
+try:
+    import ahocorasick
+except ImportError:  # 任意依存。無ければ正規表現版でフォールバック
+    ahocorasick = None
+
 from ai_video_gen.config import settings
+from ai_video_gen.services.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# プロセス全体で共有するスロットル。複数プロジェクトから同時にTTSが走っても
+# プランの同時リクエスト上限（settings.elevenlabs_concurrency）を超えないようにする
+_request_semaphore = asyncio.Semaphore(settings.elevenlabs_concurrency)
 
 # TTS用カタカナ変換辞書（大文字小文字区別なし）
 TTS_CONVERSION_DICT: dict[str, str] = {
@@ -115,28 +134,121 @@ TTS_CONVERSION_DICT: dict[str, str] = {
 }
 
 
-def convert_for_tts(text: str) -> str:
-    """テキストをTTS用にカタカナ変換"""
-    result = text
+# 変換辞書を1本の選択正規表現にまとめてインポート時にコンパイルする。
+# 単語ごとにコンパイル＋全文走査を繰り返す（O(単語数×文長)）代わりに、
+# テキストを1パス走査するだけで済む。長い語を先に並べることで
+# 「PostgreSQL」が「SQL」より優先される従来の挙動を保つ
+_TTS_PATTERN = re.compile(
+    "|".join(
+        re.escape(word)
+        for word in sorted(TTS_CONVERSION_DICT, key=len, reverse=True)
+    ),
+    re.IGNORECASE,
+)
+_TTS_LOOKUP = {word.lower(): reading for word, reading in TTS_CONVERSION_DICT.items()}
+
+# 辞書の対象は全てASCII英字を含む語。純日本語ナレーション（多数派）を
+# 辞書走査に入る前に弾くための事前チェック
+_ASCII_ALPHA = re.compile(r"[A-Za-z]")
 
-    # 辞書の単語を長い順にソート（部分一致を防ぐ）
-    sorted_words = sorted(TTS_CONVERSION_DICT.keys(), key=len, reverse=True)
+# pyahocorasickが入っていればAho-Corasickオートマトンで置換する。
+# C実装の真のO(文長)走査で、辞書サイズに依存せず正規表現VMより速い
+if ahocorasick is not None:
+    _TTS_AUTOMATON = ahocorasick.Automaton()
+    for _word, _reading in TTS_CONVERSION_DICT.items():
+        _TTS_AUTOMATON.add_word(_word.lower(), (len(_word), _reading))
+    _TTS_AUTOMATON.make_automaton()
+else:
+    _TTS_AUTOMATON = None
 
-    for word in sorted_words:
-        # 大文字小文字を区別しない置換
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
-        result = pattern.sub(TTS_CONVERSION_DICT[word], result)
 
-    return result
+def _convert_with_automaton(text: str, lowered: str) -> str:
+    """オートマトンの最長一致で置換結果を1パス組み立てる"""
+    parts: list[str] = []
+    pos = 0
+    for end, (length, reading) in _TTS_AUTOMATON.iter_long(lowered):
+        start = end - length + 1
+        if start < pos:
+            continue
+        parts.append(text[pos:start])
+        parts.append(reading)
+        pos = end + 1
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def convert_for_tts(text: str) -> str:
+    """テキストをTTS用にカタカナ変換
+
+    純関数かつ同一ナレーションの再合成・再生成で同じ入力が
+    繰り返し来るため、結果をLRUキャッシュする。
+    """
+    # ASCII英字が1文字もなければ置換対象は存在しない
+    if not _ASCII_ALPHA.search(text):
+        return text
+    if _TTS_AUTOMATON is not None:
+        lowered = text.lower()
+        # lower()で文字数が変わる特殊なUnicodeはオフセットが
+        # ずれるため正規表現版に回す
+        if len(lowered) == len(text):
+            return _convert_with_automaton(text, lowered)
+    return _TTS_PATTERN.sub(lambda m: _TTS_LOOKUP[m.group(0).lower()], text)
 
 
 class ElevenLabsService:
     """ElevenLabs API クライアント"""
 
+    # 429リトライの上限回数
+    MAX_RETRIES = 5
+
+    # 音声一覧キャッシュのTTL（秒）。カタログはほぼ変わらないため5分保持する
+    VOICES_CACHE_TTL = 300.0
+
     def __init__(self):
         self.api_key = settings.elevenlabs_api_key
         self.voice_id = settings.elevenlabs_voice_id or "21m00Tcm4TlvDq8ikWAM"  # デフォルト: Rachel
         self.base_url = "https://api.elevenlabs.io/v1"
+        self._voices_cache: tuple[float, list[dict]] | None = None
+        self._voices_lock = asyncio.Lock()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """セマフォで同時実行を制限してリクエストを送信（429は自動リトライ）
+
+        - too_many_concurrent_requests: 同時実行超過。短い待機後にキューへ再投入
+        - system_busy: サーバー過負荷。ジッター付き指数バックオフ（0.5·2^n、上限30秒）
+        - Retry-Afterヘッダーがあればそれを優先
+        """
+        # 共有プールクライアント（HTTP/2）を使う。並列TTSの8リクエストが
+        # 1本のTLS接続上の多重ストリームとして流れ、接続セットアップを払わない
+        client = await get_http_client()
+
+        response: httpx.Response | None = None
+        for attempt in range(self.MAX_RETRIES):
+            async with _request_semaphore:
+                response = await client.request(method, url, **kwargs)
+
+            if response.status_code != 429:
+                return response
+
+            await self._retry_backoff(
+                attempt, response.headers.get("Retry-After"), response.text
+            )
+
+        return response
+
+    @staticmethod
+    async def _retry_backoff(attempt: int, retry_after: str | None, body: str) -> None:
+        """429リトライ前の待機（_requestとストリーミング版で共有）"""
+        if retry_after:
+            await asyncio.sleep(float(retry_after))
+        elif "too_many_concurrent_requests" in body:
+            # 同時実行枠が空くのを待つだけでよい（バックオフ不要）
+            await asyncio.sleep(0.1)
+        else:
+            # system_busy等: 指数バックオフ + ジッター
+            backoff = min(30.0, 0.5 * (2 ** attempt))
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
 
     @property
     def is_available(self) -> bool:
@@ -163,60 +275,167 @@ class ElevenLabsService:
 
         voice = voice_id or self.voice_id
 
-        # TTS用にカタカナ変換
-        tts_text = convert_for_tts(text) if convert_to_katakana else text
+        # TTS用にカタカナ変換。全脚本一括などの長文はイベントループを
+        # 塞がないようワーカースレッドで変換する
+        if not convert_to_katakana:
+            tts_text = text
+        elif len(text) > 10_000:
+            tts_text = await asyncio.to_thread(convert_for_tts, text)
+        else:
+            tts_text = convert_for_tts(text)
+
+        # 同一テキストの再合成はプロバイダを叩かずディスクキャッシュから返す
+        # （1セクションだけ直して再実行するケースが多く、ヒット率が高い）
+        cache_path = self._speech_cache_path(voice, model_id, tts_text)
+        if cache_path is not None and cache_path.exists():
+            try:
+                # 数MBのMP3読み込みでイベントループを止めない
+                return await asyncio.to_thread(cache_path.read_bytes)
+            except OSError:
+                pass
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/text-to-speech/{voice}",
-                    headers={
-                        "xi-api-key": self.api_key,
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "text": tts_text,
-                        "model_id": model_id,
-                        "voice_settings": {
-                            "stability": 0.5,
-                            "similarity_boost": 0.75,
-                            "style": 0.0,
-                            "use_speaker_boost": True,
+            # /streamエンドポイント + チャンク受信。合成完了を待たずに
+            # 音声が届き始め、レスポンス全体をhttpx内部で二重に
+            # バッファしない
+            client = await get_http_client()
+            audio_bytes: bytes | None = None
+            for attempt in range(self.MAX_RETRIES):
+                retry_after: str | None = None
+                body = ""
+                async with _request_semaphore:
+                    async with client.stream(
+                        "POST",
+                        f"{self.base_url}/text-to-speech/{voice}/stream",
+                        headers={
+                            "xi-api-key": self.api_key,
+                            "Content-Type": "application/json",
+                        },
+                        json={
+                            "text": tts_text,
+                            "model_id": model_id,
+                            "voice_settings": {
+                                "stability": 0.5,
+                                "similarity_boost": 0.75,
+                                "style": 0.0,
+                                "use_speaker_boost": True,
+                            },
                         },
-                    },
-                    timeout=60.0,
-                )
-                response.raise_for_status()
-                return response.content
-        except Exception as e:
-            print(f"Speech generation failed: {e}")
+                        timeout=60.0,
+                    ) as response:
+                        if response.status_code == 429:
+                            body = (await response.aread()).decode("utf-8", "ignore")
+                            retry_after = response.headers.get("Retry-After")
+                        else:
+                            response.raise_for_status()
+                            buf = bytearray()
+                            async for chunk in response.aiter_bytes(65536):
+                                buf += chunk
+                            audio_bytes = bytes(buf)
+                if audio_bytes is not None:
+                    break
+                await self._retry_backoff(attempt, retry_after, body)
+
+            if audio_bytes is None:
+                return None
+            if cache_path is not None:
+                try:
+                    cache_path.parent.mkdir(parents=True, exist_ok=True)
+                    await asyncio.to_thread(cache_path.write_bytes, audio_bytes)
+                except OSError:
+                    # キャッシュ書き込み失敗は無視して処理を続行
+                    pass
+            return audio_bytes
+        except Exception:
+            logger.exception("Speech generation failed")
+            return None
+
+    async def generate_speech_batch(
+        self,
+        texts: list[str],
+        **kwargs,
+    ) -> list[bytes | None]:
+        """複数テキストの音声を並列生成
+
+        全呼び出しを一斉に発行し、実際の同時リクエスト数は
+        プロセス共有の_request_semaphoreが上限内に抑える。
+        所要時間はレイテンシの合計ではなく最大に近づく。
+
+        変換後テキストが同一になる重複はAPI呼び出しを1回にまとめ、
+        結果を元のインデックス全てに配る（課金文字数もユニーク分だけ）。
+        """
+        convert = kwargs.get("convert_to_katakana", True)
+        groups: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            key = convert_for_tts(text) if convert else text
+            groups.setdefault(key, []).append(i)
+
+        results: list[bytes | None] = [None] * len(texts)
+
+        async def _synthesize_group(indexes: list[int]) -> None:
+            audio = await self.generate_speech(texts[indexes[0]], **kwargs)
+            for i in indexes:
+                results[i] = audio
+
+        await asyncio.gather(
+            *(_synthesize_group(indexes) for indexes in groups.values())
+        )
+        return results
+
+    def _speech_cache_path(self, voice: str, model_id: str, text: str) -> Path | None:
+        """音声キャッシュのファイルパスを返す（無効時はNone）
+
+        キーは(voice, model, 変換後テキスト)のSHA-256。どれか1つでも違えば
+        別音声になるため、全てをキーに含める。
+        """
+        if not settings.tts_cache_enabled:
             return None
+        key = sha256(f"{voice}|{model_id}|{text}".encode()).hexdigest()
+        return Path(settings.tts_cache_dir) / f"{key}.mp3"
 
     async def get_voices(self) -> list[dict]:
-        """利用可能な音声一覧を取得"""
+        """利用可能な音声一覧を取得（5分間インプロセスキャッシュ）"""
         if not self.is_available:
             return self._get_mock_voices()
 
+        if self._voices_cache is not None:
+            cached_at, voices = self._voices_cache
+            if time.monotonic() - cached_at < self.VOICES_CACHE_TTL:
+                return voices
+
+        # ロックで同時リフレッシュ（thundering herd）を防ぐ
+        async with self._voices_lock:
+            if self._voices_cache is not None:
+                cached_at, voices = self._voices_cache
+                if time.monotonic() - cached_at < self.VOICES_CACHE_TTL:
+                    return voices
+
+            voices = await self._fetch_voices()
+            self._voices_cache = (time.monotonic(), voices)
+            return voices
+
+    async def _fetch_voices(self) -> list[dict]:
+        """音声一覧をAPIから取得"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/voices",
-                    headers={"xi-api-key": self.api_key},
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return [
-                    {
-                        "voice_id": v["voice_id"],
-                        "name": v["name"],
-                        "category": v.get("category", ""),
-                        "labels": v.get("labels", {}),
-                    }
-                    for v in data.get("voices", [])
-                ]
-        except Exception as e:
-            print(f"Failed to get voices: {e}")
+            response = await self._request(
+                "GET",
+                f"{self.base_url}/voices",
+                headers={"xi-api-key": self.api_key},
+                timeout=30.0,
+            )
+            response.raise_for_status()
+            data = response.json()
+            return [
+                {
+                    "voice_id": v["voice_id"],
+                    "name": v["name"],
+                    "category": v.get("category", ""),
+                    "labels": v.get("labels", {}),
+                }
+                for v in data.get("voices", [])
+            ]
+        except Exception:
+            logger.exception("Failed to get voices")
             return self._get_mock_voices()
 
     def _get_mock_voices(self) -> list[dict]:
@@ -229,10 +448,12 @@ class ElevenLabsService:
 
     def estimate_duration(self, text: str) -> float:
         """テキストからおおよその音声時間を推定（秒）"""
-        # 日本語: 約4文字/秒、英語: 約15文字/秒として概算
-        # 混在を想定して約6文字/秒で計算
-        chars = len(text)
-        return max(1.0, chars / 6.0)
+        # 日本語: 約4文字/秒、英語: 約15文字/秒。一律6文字/秒ではなく
+        # ASCII/非ASCIIを分けて数える。encodeはC実装の1パスで、
+        # Pythonレベルの文字ループより桁違いに速い
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        jp_chars = len(text) - ascii_chars
+        return max(1.0, ascii_chars / 15.0 + jp_chars / 4.0)
 
 
 # シングルトンインスタンス
@@ -1,21 +1,224 @@
 """FFmpeg サービス（動画合成）"""
 
 import asyncio
-import base64
+import logging
+import os
+import shutil
 import tempfile
+
+try:
+    # SIMD実装でスループットが標準比で数倍。API互換のドロップイン
+    import pybase64 as base64
+except ImportError:  # 未インストール環境では標準ライブラリ版
+    import base64
+from collections.abc import AsyncIterator
 from pathlib import Path
 from uuid import UUID
 
-from ai_video_gen.services.supabase import get_supabase_client
+import orjson
+
+from ai_video_gen.config import settings
+from ai_video_gen.services.http import get_http_client
+from ai_video_gen.services.supabase import upload_to_storage_async
+
+logger = logging.getLogger(__name__)
+
+# 同時に走らせるffmpegプロセス数の上限。各プロセスが内部で
+# マルチスレッドエンコードするため、デフォルトはコア数の半分に抑える
+_POOL_WORKERS = settings.ffmpeg_workers or max(1, (os.cpu_count() or 4) // 2)
+_encode_semaphore = asyncio.Semaphore(_POOL_WORKERS)
+
+# 1プロセスあたりのエンコードスレッド数。libx264は既定でコア数分の
+# スレッドを立てるため、並列プール全体でコア数を超えないよう頭打ちにする
+_THREADS_PER_INVOCATION = max(1, (os.cpu_count() or _POOL_WORKERS) // _POOL_WORKERS)
+
+# base64の分割処理サイズ。デコード側は4の倍数（パディング境界）、
+# エンコード側は3の倍数（出力にパディングが入らない）であること
+_B64_DECODE_CHUNK = 64 * 1024
+_B64_ENCODE_CHUNK = 57 * 1024
+
+
+def _b64_decode_to_file(data_url: str, path: Path) -> None:
+    """data URLの本体をチャンク単位でデコードしながらファイルへ書く
+
+    全体を一括でbytes化すると符号化文字列＋デコード結果の二重で
+    メモリを食うため、ピーク使用量をチャンクサイズに抑える。
+    """
+    # str→ASCII bytesの変換は1回だけ行い、チャンクはmemoryviewの
+    # ゼロコピースライスで渡す（チャンクごとのstrスライス生成と
+    # b64decode内部の暗黙的なASCII変換を省く）
+    encoded = data_url.split(",", 1)[1].encode("ascii")
+    view = memoryview(encoded)
+    with open(path, "wb") as f:
+        for i in range(0, len(view), _B64_DECODE_CHUNK):
+            f.write(base64.b64decode(view[i : i + _B64_DECODE_CHUNK]))
+
+
+# RAM上のtmpfs。中間ファイル（音声・セグメントMP4）をここに置くと
+# ffmpegの読み書きがディスクを経由しなくなる
+_TMPFS_ROOT = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
+
+def _tmp_root(estimated_size: int) -> str | None:
+    """中間ファイル置き場のルートを返す（Noneならシステム既定の/tmp）
+
+    tmpfsは小さいコンテナでOOMを招きうるためffmpeg_tmpfsでオプトイン
+    とし、有効時も空き容量が推定サイズに満たなければ使わない。
+    """
+    if not settings.ffmpeg_tmpfs or _TMPFS_ROOT is None:
+        return None
+    try:
+        if shutil.disk_usage(_TMPFS_ROOT).free > estimated_size:
+            return _TMPFS_ROOT
+    except OSError:
+        pass
+    return None
+
+
+def _copy_file(src: Path, dst: Path) -> None:
+    """ファイルをカーネル内コピーで複製する
+
+    os.sendfileならユーザー空間へのバッファ往復なしで転送できる。
+    非対応のプラットフォーム／ファイルシステムでは1MiBバッファの
+    copyfileobjにフォールバックする（どちらも全量をメモリに載せない）。
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            if offset:
+                raise  # 途中失敗は重複書き込みを避けてそのまま上げる
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+def _b64_encode_file(path: Path) -> str:
+    """ファイルをチャンク単位でbase64エンコードして結合する"""
+    chunks: list[str] = []
+    with open(path, "rb") as f:
+        while chunk := f.read(_B64_ENCODE_CHUNK):
+            chunks.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(chunks)
 
 
 class FFmpegService:
     """FFmpeg 動画合成サービス"""
 
+    # ストリーミング配信時の読み出しチャンクサイズ
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # ハードウェアH.264エンコーダの優先順（NVIDIA → Intel → VAAPI → AMD）
+    HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_vaapi", "h264_amf")
+
+    # セクションタイプごとのプレースホルダー背景色
+    PLACEHOLDER_COLORS = {
+        "title": "#1a1a2e",
+        "slide": "#16213e",
+        "code": "#0d1117",
+        "summary": "#1a1a2e",
+    }
+
     def __init__(self):
         self.output_width = 1920
         self.output_height = 1080
         self.fps = 30
+        self._encoder: str | None = None
+        # ffprobe結果のキャッシュ。(パス, mtime_ns)がキーなので
+        # ファイルが書き換われば自然に無効化される
+        self._probe_cache: dict[tuple[str, int], dict] = {}
+
+    async def _get_video_encoder(self) -> str:
+        """使用するH.264エンコーダを決定（初回のみ検出、以後キャッシュ）
+
+        -encodersの一覧はビルドに含まれるエンコーダを示すだけで、
+        GPUやドライバの無い環境でも並ぶ（Debian系ビルドのh264_nvenc等）。
+        そのため候補は1フレームの試しエンコードに通ってから採用し、
+        実際に使えないエンコーダをキャッシュして全セグメント生成を
+        失敗させないようにする。ffmpeg_hwaccel=noneで検出自体を
+        無効化できる。
+        """
+        if self._encoder is not None:
+            return self._encoder
+
+        if settings.ffmpeg_hwaccel != "auto":
+            self._encoder = "libx264"
+            return self._encoder
+
+        self._encoder = "libx264"
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-encoders",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await proc.communicate()
+            available = stdout.decode("utf-8", "ignore")
+            for enc in self.HW_ENCODERS:
+                if enc in available and await self._trial_encode(enc):
+                    self._encoder = enc
+                    break
+        except Exception:
+            pass
+        return self._encoder
+
+    async def _trial_encode(self, encoder: str) -> bool:
+        """1フレームの試しエンコードでエンコーダが実際に使えるか確認
+
+        本番と同じコーデック引数を使うため、デバイス指定や追加フィルタが
+        必要なエンコーダ（h264_vaapi等）もここで弾かれてlibx264に落ちる。
+        """
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "lavfi",
+                "-i", f"color=c=black:s=256x144:r={self.fps}",
+                "-frames:v", "1",
+                *self._video_codec_args(encoder, still_image=False),
+                "-f", "null", "-",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await proc.communicate()
+            return proc.returncode == 0
+        except Exception:
+            return False
+
+    @staticmethod
+    def _video_codec_args(encoder: str, still_image: bool) -> list[str]:
+        """エンコーダごとの-c:v以降の引数を返す"""
+        if encoder == "h264_nvenc":
+            return ["-c:v", encoder, "-preset", "p4", "-rc", "vbr"]
+        if encoder == "h264_amf":
+            return ["-c:v", encoder, "-quality", "speed"]
+        if encoder in ("h264_qsv", "h264_vaapi"):
+            return ["-c:v", encoder]
+        if still_image:
+            # 静止画ループはstillimageチューニングが効く（libx264のみ）
+            return ["-c:v", "libx264", "-tune", "stillimage"]
+        return ["-c:v", "libx264"]
+
+    def _stream_copy_compat_args(self) -> list[str]:
+        """全セグメントのフレームレート・タイムベース・GOPを揃える引数
+
+        セグメント間でこれらが食い違うとconcatの-c copyが黙って
+        再エンコードやPTSずれを起こすため、明示的に固定する。
+        """
+        return [
+            "-r", str(self.fps),
+            "-g", str(self.fps * 2),
+            "-video_track_timescale", "15360",
+        ]
+
+    def _intermediate_root(self, sections: list[dict]) -> str | None:
+        """中間ファイル置き場を決める（tmpfs有効時はRAM上に置く）"""
+        total_duration = sum(float(s.get("duration") or 0) for s in sections)
+        # セグメント群＋結合出力＋デコード済み音声で推定サイズの約3倍を見込む
+        return _tmp_root(self.estimate_file_size(total_duration) * 3)
 
     async def check_ffmpeg(self) -> bool:
         """FFmpegがインストールされているか確認"""
@@ -36,80 +239,280 @@ class FFmpegService:
         sections: list[dict],
     ) -> str:
         """セクションから動画を合成"""
-        client = get_supabase_client()
-
         # FFmpegが利用可能か確認
         if not await self.check_ffmpeg():
             raise RuntimeError("FFmpeg is not installed")
 
-        with tempfile.TemporaryDirectory() as tmpdir:
+        with tempfile.TemporaryDirectory(dir=self._intermediate_root(sections)) as tmpdir:
             tmppath = Path(tmpdir)
-            segment_files = []
-
-            for idx, section in enumerate(sections):
-                duration = section.get("duration") or 5.0
-                slide_path = section.get("slide_image_path")
-                audio_path = section.get("narration_audio_path")
-
-                # スライドをPNGとして保存
-                slide_file = tmppath / f"slide_{idx:03d}.png"
-                if slide_path and slide_path.startswith("data:"):
-                    # data URLからHTMLを抽出してスクリーンショット
-                    # 簡易実装: 単色画像を生成
-                    await self._create_placeholder_image(slide_file, section.get("type", "slide"))
-                else:
-                    await self._create_placeholder_image(slide_file, section.get("type", "slide"))
-
-                # 音声ファイルを保存
-                audio_file = None
-                if audio_path and audio_path.startswith("data:audio"):
-                    audio_file = tmppath / f"audio_{idx:03d}.mp3"
-                    audio_data = audio_path.split(",")[1]
-                    audio_file.write_bytes(base64.b64decode(audio_data))
-
-                # セグメント動画を生成
-                segment_file = tmppath / f"segment_{idx:03d}.mp4"
-                await self._create_segment(
-                    slide_file,
-                    audio_file,
-                    segment_file,
-                    duration,
-                )
-                segment_files.append(segment_file)
-
-            # セグメントを結合
             output_file = tmppath / "output.mp4"
-            await self._concat_segments(segment_files, output_file)
-
-            # 出力ファイルをbase64エンコード
-            video_bytes = output_file.read_bytes()
-            video_base64 = base64.b64encode(video_bytes).decode("utf-8")
-            video_data_url = f"data:video/mp4;base64,{video_base64}"
-
-            return video_data_url
-
-    async def _create_placeholder_image(self, output_path: Path, section_type: str) -> None:
-        """プレースホルダー画像を生成"""
-        # 背景色を設定
-        colors = {
-            "title": "#1a1a2e",
-            "slide": "#16213e",
-            "code": "#0d1117",
-            "summary": "#1a1a2e",
-        }
-        color = colors.get(section_type, "#1a1a2e")
-
-        # FFmpegで単色画像を生成
-        proc = await asyncio.create_subprocess_exec(
+
+            if _POOL_WORKERS == 1 and len(sections) > 1:
+                # プロセス並列が効かない構成ではセグメント分割の利点がなく、
+                # N+1回のffmpeg起動コストだけが残るため1回の起動に畳む
+                await self._compose_single_pass(tmppath, sections, output_file)
+            else:
+                segment_files = await self._build_segments(tmppath, sections)
+                # セグメントを結合
+                await self._concat_segments(segment_files, output_file)
+
+            video_bytes = await asyncio.to_thread(output_file.read_bytes)
+
+            # Storageにアップロードして公開URLを返す。base64 data URLは
+            # JSONに載せるとファイルサイズの約1.33倍の文字列をメモリと
+            # DBに抱えるため、ローカル開発のフォールバックに限定する
+            storage_url = await upload_to_storage_async(
+                "project-outputs",
+                f"{project_id}/output.mp4",
+                video_bytes,
+                "video/mp4",
+            )
+            if storage_url:
+                return storage_url
+
+            video_base64 = await asyncio.to_thread(_b64_encode_file, output_file)
+            return f"data:video/mp4;base64,{video_base64}"
+
+    async def stream_compose(
+        self,
+        project_id: UUID,
+        sections: list[dict],
+    ) -> AsyncIterator[bytes]:
+        """動画を合成しながらMP4バイト列をストリーミングで返す
+
+        結合ffmpegの出力をパイプから64KiBずつ読み出すため、
+        完成ファイル全体をメモリに載せずにクライアントへ配信できる。
+        """
+        if not await self.check_ffmpeg():
+            raise RuntimeError("FFmpeg is not installed")
+
+        with tempfile.TemporaryDirectory(dir=self._intermediate_root(sections)) as tmpdir:
+            tmppath = Path(tmpdir)
+            segment_files = await self._build_segments(tmppath, sections)
+
+            # concat用のリストファイルを作成
+            list_file = tmppath / "concat_list.txt"
+            with open(list_file, "w") as f:
+                for seg in segment_files:
+                    f.write(f"file '{seg}'\n")
+
+            # fragmented MP4で出力すればシーク不要でパイプに流せる
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-y",
+                "-hide_banner", "-loglevel", "error",
+                "-f", "concat",
+                "-safe", "0",
+                "-i", str(list_file),
+                "-c", "copy",
+                "-movflags", "frag_keyframe+empty_moov",
+                "-f", "mp4",
+                "pipe:1",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+
+            # stderrはstdoutと並行して回収する。stdoutのEOFまで放置すると
+            # パイプバッファ（64KiB）が埋まった時点でffmpegの書き込みが
+            # 止まり、ストリーム全体がデッドロックする
+            stderr_task = asyncio.create_task(proc.stderr.read())
+            try:
+                while True:
+                    chunk = await proc.stdout.read(self.STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+                await proc.wait()
+                if proc.returncode != 0:
+                    stderr = await stderr_task
+                    raise RuntimeError(
+                        f"FFmpeg stream compose failed: {stderr.decode()}"
+                    )
+            finally:
+                # クライアント切断（GeneratorExit）でもffmpegを残さない。
+                # 一時ディレクトリはこの後に削除されるため、先にプロセスを
+                # 確実に終わらせる
+                if proc.returncode is None:
+                    proc.kill()
+                stderr_task.cancel()
+                await proc.wait()
+
+    async def _build_segments(self, tmppath: Path, sections: list[dict]) -> list[Path]:
+        """各セクションのセグメント動画を生成
+
+        セクションは互いに独立なので全セグメントを並列にエンコードする。
+        直列のsum(エンコード時間)がほぼmax(エンコード時間)×並列度分の1に
+        縮む。同時プロセス数は_encode_semaphoreが抑える。
+        """
+        tasks = [
+            self._build_one_segment(tmppath, idx, section)
+            for idx, section in enumerate(sections)
+        ]
+        # gatherは渡した順で結果を返すためセグメント順は保たれる
+        return list(await asyncio.gather(*tasks))
+
+    async def _prepare_audio(
+        self,
+        tmppath: Path,
+        idx: int,
+        section: dict,
+    ) -> Path | None:
+        """セクションの音声をローカルファイルに用意する
+
+        narration_audio_pathはdata URL（ローカル開発）または
+        StorageのURLのどちらか。どちらでもなければNone。
+        """
+        audio_path = section.get("narration_audio_path")
+        if audio_path and audio_path.startswith("data:audio"):
+            audio_file = tmppath / f"audio_{idx:03d}.mp3"
+            await asyncio.to_thread(_b64_decode_to_file, audio_path, audio_file)
+            return audio_file
+        if audio_path and audio_path.startswith(("http://", "https://")):
+            audio_file = tmppath / f"audio_{idx:03d}.mp3"
+            client = await get_http_client()
+            response = await client.get(audio_path)
+            response.raise_for_status()
+            audio_file.write_bytes(response.content)
+            return audio_file
+        return None
+
+    async def _build_one_segment(
+        self,
+        tmppath: Path,
+        idx: int,
+        section: dict,
+    ) -> Path:
+        """1セクション分のセグメント動画を生成"""
+        duration = section.get("duration") or 5.0
+        audio_file = await self._prepare_audio(tmppath, idx, section)
+
+        # セグメント動画を生成
+        # スライド画像のスクリーンショット化は未実装のため、
+        # lavfiのcolorソースで単色セグメントを直接生成する。
+        # 以前のPNG生成→再エンコードの2プロセスを1プロセスに畳む
+        segment_file = tmppath / f"segment_{idx:03d}.mp4"
+        color = self.PLACEHOLDER_COLORS.get(section.get("type", "slide"), "#1a1a2e")
+        await self._create_color_segment(
+            color,
+            audio_file,
+            segment_file,
+            duration,
+        )
+        return segment_file
+
+    async def _compose_single_pass(
+        self,
+        tmppath: Path,
+        sections: list[dict],
+        output_file: Path,
+    ) -> None:
+        """全セクションを1回のffmpeg起動で合成する
+
+        セクションごとのcolor/音声入力をconcatフィルタで連結し、
+        セグメント生成＋結合のN+1回のfork/exec・コーデック初期化を
+        1プロセスに畳む。単一プロセスなのでffmpeg既定のスレッド数
+        （全コア）に任せる。音声のないセクションはanullsrcで埋め、
+        各音声はapad＋atrimでセクション長に揃える（-shortest相当）。
+        """
+        n = len(sections)
+        encoder = await self._get_video_encoder()
+        audio_files = await asyncio.gather(
+            *(self._prepare_audio(tmppath, idx, s) for idx, s in enumerate(sections))
+        )
+
+        cmd = ["ffmpeg", "-y"]
+        durations = [float(s.get("duration") or 5.0) for s in sections]
+        for section, duration in zip(sections, durations):
+            color = self.PLACEHOLDER_COLORS.get(section.get("type", "slide"), "#1a1a2e")
+            cmd += [
+                "-f", "lavfi", "-t", str(duration),
+                "-i",
+                f"color=c={color}:s={self.output_width}x{self.output_height}:r={self.fps}",
+            ]
+        for audio_file, duration in zip(audio_files, durations):
+            if audio_file is not None:
+                cmd += ["-i", str(audio_file)]
+            else:
+                cmd += [
+                    "-f", "lavfi", "-t", str(duration),
+                    "-i", "anullsrc=channel_layout=stereo:sample_rate=44100",
+                ]
+
+        trims = ";".join(
+            f"[{n + i}:a]apad,atrim=0:{durations[i]}[a{i}]" for i in range(n)
+        )
+        pairs = "".join(f"[{i}:v][a{i}]" for i in range(n))
+        filter_complex = f"{trims};{pairs}concat=n={n}:v=1:a=1[v][a]"
+
+        cmd += [
+            "-filter_complex", filter_complex,
+            "-map", "[v]",
+            "-map", "[a]",
+            *self._video_codec_args(encoder, still_image=True),
+            "-c:a", "aac",
+            "-b:a", "192k",
+            "-pix_fmt", "yuv420p",
+            str(output_file),
+        ]
+
+        async with _encode_semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            raise RuntimeError(f"FFmpeg single-pass compose failed: {stderr.decode()}")
+
+    async def _create_color_segment(
+        self,
+        color: str,
+        audio_path: Path | None,
+        output_path: Path,
+        duration: float,
+    ) -> None:
+        """単色背景のセグメント動画を1プロセスで生成"""
+        encoder = await self._get_video_encoder()
+        source = (
+            f"color=c={color}:s={self.output_width}x{self.output_height}"
+            f":r={self.fps}:d={duration}"
+        )
+        cmd = [
             "ffmpeg", "-y",
+            "-threads", str(_THREADS_PER_INVOCATION),
             "-f", "lavfi",
-            "-i", f"color=c={color}:s={self.output_width}x{self.output_height}:d=1",
-            "-frames:v", "1",
-            str(output_path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        await proc.communicate()
+            "-i", source,
+        ]
+        if audio_path and audio_path.exists():
+            cmd += [
+                "-i", str(audio_path),
+                *self._video_codec_args(encoder, still_image=True),
+                "-c:a", "aac",
+                "-b:a", "192k",
+                "-pix_fmt", "yuv420p",
+                *self._stream_copy_compat_args(),
+                "-shortest",
+            ]
+        else:
+            cmd += [
+                *self._video_codec_args(encoder, still_image=True),
+                "-pix_fmt", "yuv420p",
+                *self._stream_copy_compat_args(),
+            ]
+        cmd.append(str(output_path))
+
+        async with _encode_semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await proc.communicate()
+
+        if proc.returncode != 0:
+            raise RuntimeError(f"FFmpeg segment creation failed: {stderr.decode()}")
 
     async def _create_segment(
         self,
@@ -119,18 +522,20 @@ class FFmpegService:
         duration: float,
     ) -> None:
         """セグメント動画を生成"""
+        encoder = await self._get_video_encoder()
         if audio_path and audio_path.exists():
             # 画像 + 音声
             cmd = [
                 "ffmpeg", "-y",
+                "-threads", str(_THREADS_PER_INVOCATION),
                 "-loop", "1",
                 "-i", str(image_path),
                 "-i", str(audio_path),
-                "-c:v", "libx264",
-                "-tune", "stillimage",
+                *self._video_codec_args(encoder, still_image=True),
                 "-c:a", "aac",
                 "-b:a", "192k",
                 "-pix_fmt", "yuv420p",
+                *self._stream_copy_compat_args(),
                 "-shortest",
                 str(output_path),
             ]
@@ -138,21 +543,23 @@ class FFmpegService:
             # 画像のみ（指定時間）
             cmd = [
                 "ffmpeg", "-y",
+                "-threads", str(_THREADS_PER_INVOCATION),
                 "-loop", "1",
                 "-i", str(image_path),
-                "-c:v", "libx264",
+                *self._video_codec_args(encoder, still_image=False),
                 "-t", str(duration),
                 "-pix_fmt", "yuv420p",
-                "-r", str(self.fps),
+                *self._stream_copy_compat_args(),
                 str(output_path),
             ]
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        _, stderr = await proc.communicate()
+        async with _encode_semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await proc.communicate()
 
         if proc.returncode != 0:
             raise RuntimeError(f"FFmpeg segment creation failed: {stderr.decode()}")
@@ -162,15 +569,23 @@ class FFmpegService:
         segment_files: list[Path],
         output_path: Path,
     ) -> None:
-        """セグメントを結合"""
+        """セグメントを結合
+
+        将来ここにトリムを足す場合は、-ssを-iより前に置くこと。
+        入力前の-ssはキーフレームインデックスによる高速シークになり、
+        入力後に置くとデコードしながらの読み捨てでGOP数ではなく
+        フレーム数に比例して遅くなる。
+        """
         if not segment_files:
             raise ValueError("No segments to concat")
 
         if len(segment_files) == 1:
-            # 1つだけならコピー
-            output_path.write_bytes(segment_files[0].read_bytes())
+            # 1つだけならffmpegを起動せずカーネル内コピーで済ませる
+            await asyncio.to_thread(_copy_file, segment_files[0], output_path)
             return
 
+        await self._warn_if_streams_mismatch(segment_files[0])
+
         # concat用のリストファイルを作成
         list_file = output_path.parent / "concat_list.txt"
         with open(list_file, "w") as f:
@@ -196,6 +611,50 @@ class FFmpegService:
         if proc.returncode != 0:
             raise RuntimeError(f"FFmpeg concat failed: {stderr.decode()}")
 
+    async def _probe(self, path: Path) -> dict:
+        """ffprobeのストリーム情報を取得（(パス, mtime_ns)単位でキャッシュ）
+
+        同じファイルを繰り返し検査してもffprobeを起動し直さない。
+        失敗時は空dictをキャッシュして再試行の連発も避ける。
+        """
+        key = (str(path), path.stat().st_mtime_ns)
+        cached = self._probe_cache.get(key)
+        if cached is not None:
+            return cached
+
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error",
+            "-show_entries", "stream=codec_name,time_base,duration",
+            "-print_format", "json",
+            str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
+        info: dict = orjson.loads(stdout) if proc.returncode == 0 and stdout else {}
+        self._probe_cache[key] = info
+        return info
+
+    async def _warn_if_streams_mismatch(self, segment: Path) -> None:
+        """先頭セグメントの映像ストリームが想定パラメータか検査
+
+        ずれていてもconcat自体は走るが、-c copyが静かに劣化する
+        回帰を早期に気付けるよう警告だけ出す。
+        """
+        try:
+            info = await self._probe(segment)
+            streams = info.get("streams", [])
+            if streams and not any(
+                s.get("codec_name") == "h264" and s.get("time_base") == "1/15360"
+                for s in streams
+            ):
+                logger.warning(
+                    "Segment streams are not stream-copy compatible: %s", streams
+                )
+        except Exception:
+            # ffprobeが無い環境でも結合自体は続行する
+            pass
+
     def estimate_file_size(self, total_duration: float) -> int:
         """動画ファイルサイズを推定（バイト）"""
         # 概算: 1080p @ 30fps で約 5MB/分
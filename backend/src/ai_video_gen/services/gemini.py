@@ -1,12 +1,62 @@
 """Gemini API サービス（画像生成 + Vision）"""
 
-import base64
+import asyncio
 import json
+import logging
 from pathlib import Path
 
-import httpx
+try:
+    # SIMD実装でスループットが標準比で数倍。API互換のドロップイン
+    import pybase64 as base64
+except ImportError:  # 未インストール環境では標準ライブラリ版
+    import base64
 
 from ai_video_gen.config import settings
+from ai_video_gen.services.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# 画像生成APIの同時リクエスト数をプロセス全体で制限する
+_image_gen_semaphore = asyncio.Semaphore(settings.image_gen_concurrency)
+
+_BASE_PROMPT = "教育動画用のスライド画像を生成してください。シンプルでプロフェッショナルなデザイン、16:9のアスペクト比。"
+
+
+def _title_prompt(spec: dict) -> str:
+    title = spec.get("title", "")
+    subtitle = spec.get("subtitle", "")
+    return f"{_BASE_PROMPT} タイトルスライド: メインタイトル「{title}」、サブタイトル「{subtitle}」"
+
+
+def _slide_prompt(spec: dict) -> str:
+    heading = spec.get("heading", "")
+    bullets_text = "、".join(spec.get("bullets", []))
+    return f"{_BASE_PROMPT} 説明スライド: 見出し「{heading}」、箇条書き: {bullets_text}"
+
+
+def _code_prompt(spec: dict) -> str:
+    language = spec.get("language", "python")
+    code = spec.get("code", "")
+    return f"{_BASE_PROMPT} コードスライド: {language}のコードを表示。シンタックスハイライト付き。コード: {code[:200]}"
+
+
+def _summary_prompt(spec: dict) -> str:
+    points_text = "、".join(spec.get("points", []))
+    return f"{_BASE_PROMPT} まとめスライド: ポイント: {points_text}"
+
+
+def _default_prompt(spec: dict) -> str:
+    return f"{_BASE_PROMPT} {json.dumps(spec, ensure_ascii=False)}"
+
+
+# セクションタイプ→プロンプトビルダーのディスパッチテーブル。
+# if/elif連鎖と違い、タイプ追加時もここに1行足すだけで済む
+_PROMPT_BUILDERS = {
+    "title": _title_prompt,
+    "slide": _slide_prompt,
+    "code": _code_prompt,
+    "summary": _summary_prompt,
+}
 
 
 class GeminiService:
@@ -35,64 +85,59 @@ class GeminiService:
         prompt = self._build_image_prompt(visual_spec, section_type)
 
         try:
-            async with httpx.AsyncClient() as client:
-                # Gemini 2.0 Flash で画像生成
-                response = await client.post(
-                    f"{self.base_url}/models/{self.model}:generateContent",
-                    params={"key": self.api_key},
-                    json={
-                        "contents": [{
-                            "parts": [{
-                                "text": prompt
-                            }]
-                        }],
-                        "generationConfig": {
-                            "responseModalities": ["image", "text"],
-                        }
-                    },
-                    timeout=60.0,
-                )
-                response.raise_for_status()
-                result = response.json()
-
-                # 画像データを抽出
-                for part in result.get("candidates", [{}])[0].get("content", {}).get("parts", []):
-                    if "inlineData" in part:
-                        image_data = part["inlineData"]["data"]
-                        return base64.b64decode(image_data)
-
-                return None
-        except Exception as e:
-            print(f"Image generation failed: {e}")
-            return None
+            # 共有プールクライアント（HTTP/2）を使い、呼び出しごとの
+            # TLSハンドシェイクを払わない
+            client = await get_http_client()
+            # Gemini 2.0 Flash で画像生成
+            response = await client.post(
+                f"{self.base_url}/models/{self.model}:generateContent",
+                params={"key": self.api_key},
+                json={
+                    "contents": [{
+                        "parts": [{
+                            "text": prompt
+                        }]
+                    }],
+                    "generationConfig": {
+                        "responseModalities": ["image", "text"],
+                    }
+                },
+                timeout=60.0,
+            )
+            response.raise_for_status()
+            result = response.json()
+
+            # 画像データを抽出
+            for part in result.get("candidates", [{}])[0].get("content", {}).get("parts", []):
+                if "inlineData" in part:
+                    image_data = part["inlineData"]["data"]
+                    return base64.b64decode(image_data)
 
-    def _build_image_prompt(self, visual_spec: dict, section_type: str) -> str:
-        """visual_specからプロンプトを構築"""
-        base_prompt = "教育動画用のスライド画像を生成してください。シンプルでプロフェッショナルなデザイン、16:9のアスペクト比。"
-
-        if section_type == "title":
-            title = visual_spec.get("title", "")
-            subtitle = visual_spec.get("subtitle", "")
-            return f"{base_prompt} タイトルスライド: メインタイトル「{title}」、サブタイトル「{subtitle}」"
+            return None
+        except Exception:
+            logger.exception("Image generation failed")
+            return None
 
-        elif section_type == "slide":
-            heading = visual_spec.get("heading", "")
-            bullets = visual_spec.get("bullets", [])
-            bullets_text = "、".join(bullets)
-            return f"{base_prompt} 説明スライド: 見出し「{heading}」、箇条書き: {bullets_text}"
+    async def generate_slide_images_batch(
+        self,
+        items: list[tuple[dict, str]],
+    ) -> list[bytes | None]:
+        """複数スライド画像を並列生成
 
-        elif section_type == "code":
-            language = visual_spec.get("language", "python")
-            code = visual_spec.get("code", "")
-            return f"{base_prompt} コードスライド: {language}のコードを表示。シンタックスハイライト付き。コード: {code[:200]}"
+        (visual_spec, section_type)のリストを一斉に投げ、同時リクエスト数は
+        _image_gen_semaphoreで抑える。結果は入力と同じ順で返る。
+        """
+        async def _one(visual_spec: dict, section_type: str) -> bytes | None:
+            async with _image_gen_semaphore:
+                return await self.generate_slide_image(visual_spec, section_type)
 
-        elif section_type == "summary":
-            points = visual_spec.get("points", [])
-            points_text = "、".join(points)
-            return f"{base_prompt} まとめスライド: ポイント: {points_text}"
+        return await asyncio.gather(
+            *(_one(spec, section_type) for spec, section_type in items)
+        )
 
-        else:
-            return f"{base_prompt} {json.dumps(visual_spec, ensure_ascii=False)}"
+    def _build_image_prompt(self, visual_spec: dict, section_type: str) -> str:
+        """visual_specからプロンプトを構築（ディスパッチテーブル参照）"""
+        return _PROMPT_BUILDERS.get(section_type, _default_prompt)(visual_spec)
 
     async def analyze_visual_diff(
         self,
@@ -125,44 +170,44 @@ JSON形式で出力:
 """
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/models/gemini-2.0-flash-exp:generateContent",
-                    params={"key": self.api_key},
-                    json={
-                        "contents": [{
-                            "parts": [
-                                {"text": prompt},
-                                {
-                                    "inlineData": {
-                                        "mimeType": "image/png",
-                                        "data": base64.b64encode(original_image).decode(),
-                                    }
-                                },
-                                {
-                                    "inlineData": {
-                                        "mimeType": "image/png",
-                                        "data": base64.b64encode(edited_image).decode(),
-                                    }
-                                },
-                            ]
-                        }],
-                    },
-                    timeout=60.0,
-                )
-                response.raise_for_status()
-                result = response.json()
-
-                content = result["candidates"][0]["content"]["parts"][0]["text"]
-                # JSON部分を抽出
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0]
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0]
-
-                return json.loads(content.strip())
-        except Exception as e:
-            print(f"Visual diff analysis failed: {e}")
+            client = await get_http_client()
+            response = await client.post(
+                f"{self.base_url}/models/gemini-2.0-flash-exp:generateContent",
+                params={"key": self.api_key},
+                json={
+                    "contents": [{
+                        "parts": [
+                            {"text": prompt},
+                            {
+                                "inlineData": {
+                                    "mimeType": "image/png",
+                                    "data": base64.b64encode(original_image).decode(),
+                                }
+                            },
+                            {
+                                "inlineData": {
+                                    "mimeType": "image/png",
+                                    "data": base64.b64encode(edited_image).decode(),
+                                }
+                            },
+                        ]
+                    }],
+                },
+                timeout=60.0,
+            )
+            response.raise_for_status()
+            result = response.json()
+
+            content = result["candidates"][0]["content"]["parts"][0]["text"]
+            # JSON部分を抽出
+            if "```json" in content:
+                content = content.split("```json")[1].split("```")[0]
+            elif "```" in content:
+                content = content.split("```")[1].split("```")[0]
+
+            return json.loads(content.strip())
+        except Exception:
+            logger.exception("Visual diff analysis failed")
             return self._mock_visual_diff()
 
     def _mock_visual_diff(self) -> dict:
@@ -0,0 +1,103 @@
+"""共有HTTPクライアント
+
+外部API呼び出しのたびにhttpx.AsyncClientを生成するとTCP+TLSハンドシェイクを
+毎回払うことになるため、コネクションプール付きのクライアントをプロセス内で
+1つだけ持ち、全サービスで使い回す。
+"""
+
+import asyncio
+import random
+
+import httpx
+import orjson
+
+_client: httpx.AsyncClient | None = None
+_client_lock = asyncio.Lock()
+
+# 一時的な失敗の再試行回数
+MAX_RETRIES = 3
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """共有のAsyncClientを取得（初回呼び出し時に生成）"""
+    global _client
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                _client = httpx.AsyncClient(
+                    timeout=60.0,
+                    # トランスポート層で接続エラー（DNS・TCP確立失敗）を
+                    # 自動再試行する。429/5xxの再試行はpost_with_retriesや
+                    # 各サービスのバックオフ処理が担当
+                    transport=httpx.AsyncHTTPTransport(
+                        retries=3,
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_keepalive_connections=20,
+                            max_connections=100,
+                            # パイプラインのステージ間（脚本→ビジュアル→TTS）の
+                            # 待ち時間でも接続が落ちないよう長めに保持する
+                            keepalive_expiry=60.0,
+                        ),
+                    ),
+                )
+    return _client
+
+
+async def post_with_retries(
+    url: str,
+    headers: dict | None = None,
+    json: dict | None = None,
+    max_retries: int = MAX_RETRIES,
+) -> httpx.Response:
+    """POSTを一時的な失敗に対して再試行する
+
+    接続エラー・429・5xxをジッタ付き指数バックオフで再試行し、
+    429はRetry-Afterヘッダを尊重する。再試行が尽きた場合は最後の
+    レスポンスを返す（接続すらできなければ例外を送出）。
+
+    ボディはstdlib jsonではなくorjsonでシリアライズする。base64画像を
+    含む数MBのペイロードでは送信パスのdumpsが支配的になるため。
+    """
+    client = await get_http_client()
+    last_exc: httpx.TransportError | None = None
+    last_response: httpx.Response | None = None
+
+    content: bytes | None = None
+    if json is not None:
+        content = orjson.dumps(json, option=orjson.OPT_NON_STR_KEYS)
+        headers = {"content-type": "application/json", **(headers or {})}
+
+    for attempt in range(max_retries):
+        response: httpx.Response | None = None
+        try:
+            response = await client.post(url, headers=headers, content=content)
+        except httpx.TransportError as exc:
+            last_exc = exc
+
+        if response is not None:
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            last_response = response
+
+        if attempt == max_retries - 1:
+            break
+
+        delay = min(2**attempt + random.uniform(0, 0.5), 10.0)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), 30.0))
+        await asyncio.sleep(delay)
+
+    if last_response is not None:
+        return last_response
+    raise last_exc  # type: ignore[misc]
+
+
+async def close_http_client() -> None:
+    """共有クライアントを閉じる（アプリ終了時に呼ぶ）"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
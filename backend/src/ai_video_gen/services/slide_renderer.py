@@ -2,118 +2,214 @@
 
 import html
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    # SIMD実装でスループットが標準比で数倍。API互換のドロップイン
+    import pybase64 as base64
+except ImportError:  # 未インストール環境では標準ライブラリ版
+    import base64
+
+try:
+    from pygments import highlight as _pygments_highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:  # 未インストール環境では正規表現版でフォールバック
+    _pygments_highlight = None
+
+from ai_video_gen.utils.hashing import visual_hash
+
 # テンプレートディレクトリ
 TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
 
+# data URLのメモ化キャッシュ（visual_specハッシュ＋セクションタイプ）。
+# リトライや未変更セクションの再レンダリングでレンダリング＋base64を省く
+_DATA_URL_CACHE: OrderedDict[tuple[str, str], str] = OrderedDict()
+_DATA_URL_CACHE_MAX = 256
+
+
+@lru_cache(maxsize=1)
+def _template_parts() -> tuple[str, str]:
+    """スライドテンプレートを読み込み{{ content }}の前後に分割
+
+    初回だけディスクを読み、以後はレンダリングごとのファイルIOと
+    テンプレート全文のreplaceコピーを省く。
+    """
+    template = (TEMPLATE_DIR / "slide.html").read_text(encoding="utf-8")
+    prefix, suffix = template.split("{{ content }}")
+    return prefix, suffix
+
 
 def render_slide_html(visual_spec: dict, section_type: str) -> str:
     """visual_specからスライドHTMLを生成"""
-    template_path = TEMPLATE_DIR / "slide.html"
-    template = template_path.read_text(encoding="utf-8")
+    prefix, suffix = _template_parts()
+    return prefix + _generate_content(visual_spec, section_type) + suffix
 
-    content = _generate_content(visual_spec, section_type)
-    return template.replace("{{ content }}", content)
+
+# コンテンツHTMLのフォーマット雛形。文字列リテラルはインポート時に
+# 1度だけ構築し、レンダリングごとのf-string組み立てを挿入のみにする
+_TITLE_FMT = '''
+        <div class="title-slide">
+            <h1>{0}</h1>
+            <p class="subtitle">{1}</p>
+        </div>
+        '''.format
+_SLIDE_FMT = '''
+        <div class="content-slide">
+            <h2>{0}</h2>
+            <ul>{1}</ul>
+        </div>
+        '''.format
+_CODE_FMT = '''
+        <div class="code-slide">
+            <h2>{0}</h2>
+            <pre><code>{1}</code></pre>
+        </div>
+        '''.format
+_SUMMARY_FMT = '''
+        <div class="summary-slide">
+            <h2>まとめ</h2>
+            <ul>{0}</ul>
+        </div>
+        '''.format
+_DIAGRAM_FMT = '''
+        <div class="content-slide">
+            <h2>図解</h2>
+            <p style="font-size: 32px; text-align: center;">{0}</p>
+        </div>
+        '''.format
+_FALLBACK_FMT = '''
+        <div class="content-slide">
+            <pre style="font-size: 24px;">{0}</pre>
+        </div>
+        '''.format
+
+
+def _bullet_list(items: list) -> str:
+    """箇条書きを<li>列へ連結（区切り改行なしで出力バイトも節約）"""
+    return "".join("<li>" + html.escape(i) + "</li>" for i in items)
 
 
 def _generate_content(visual_spec: dict, section_type: str) -> str:
     """セクションタイプに応じたコンテンツHTML生成"""
     if section_type == "title":
-        title = html.escape(visual_spec.get("title", ""))
-        subtitle = html.escape(visual_spec.get("subtitle", ""))
-        return f'''
-        <div class="title-slide">
-            <h1>{title}</h1>
-            <p class="subtitle">{subtitle}</p>
-        </div>
-        '''
+        return _TITLE_FMT(
+            html.escape(visual_spec.get("title", "")),
+            html.escape(visual_spec.get("subtitle", "")),
+        )
 
     elif section_type == "slide":
-        heading = html.escape(visual_spec.get("heading", ""))
-        bullets = visual_spec.get("bullets", [])
-        bullets_html = "\n".join(
-            f"<li>{html.escape(b)}</li>" for b in bullets
+        return _SLIDE_FMT(
+            html.escape(visual_spec.get("heading", "")),
+            _bullet_list(visual_spec.get("bullets", [])),
         )
-        return f'''
-        <div class="content-slide">
-            <h2>{heading}</h2>
-            <ul>{bullets_html}</ul>
-        </div>
-        '''
 
     elif section_type in ("code", "code_typing"):
         language = visual_spec.get("language", "python")
         code = visual_spec.get("code", "")
-        highlighted_code = _highlight_code(code, language)
-        return f'''
-        <div class="code-slide">
-            <h2>{html.escape(language.upper())}</h2>
-            <pre><code>{highlighted_code}</code></pre>
-        </div>
-        '''
+        return _CODE_FMT(html.escape(language.upper()), _highlight_code(code, language))
 
     elif section_type == "summary":
-        points = visual_spec.get("points", [])
-        points_html = "\n".join(
-            f"<li>{html.escape(p)}</li>" for p in points
-        )
-        return f'''
-        <div class="summary-slide">
-            <h2>まとめ</h2>
-            <ul>{points_html}</ul>
-        </div>
-        '''
+        return _SUMMARY_FMT(_bullet_list(visual_spec.get("points", [])))
 
     elif section_type == "diagram":
-        description = html.escape(visual_spec.get("description", ""))
-        return f'''
-        <div class="content-slide">
-            <h2>図解</h2>
-            <p style="font-size: 32px; text-align: center;">{description}</p>
-        </div>
-        '''
+        return _DIAGRAM_FMT(html.escape(visual_spec.get("description", "")))
 
     else:
         # 汎用表示
         import json
-        content = html.escape(json.dumps(visual_spec, ensure_ascii=False, indent=2))
-        return f'''
-        <div class="content-slide">
-            <pre style="font-size: 24px;">{content}</pre>
-        </div>
-        '''
+        return _FALLBACK_FMT(
+            html.escape(json.dumps(visual_spec, ensure_ascii=False, indent=2))
+        )
+
+
+# シンタックスハイライトの置換テーブル。パターンはインポート時に
+# コンパイルし、コードセクションのたびにre.subへ生文字列を渡して
+# 再コンパイルさせない（適用順は従来どおり）
+_FUNCTION_CALL = re.compile(r'\b(\w+)\(')
+_HIGHLIGHTERS: dict[str, list[tuple[re.Pattern[str], str]]] = {
+    "python": [
+        (
+            re.compile(r'\b(def|class|if|else|elif|for|while|return|import|from|as|try|except|with|in|not|and|or|True|False|None)\b'),
+            r'<span class="keyword">\1</span>',
+        ),
+        (
+            re.compile(r'(&quot;.*?&quot;|&#x27;.*?&#x27;)'),
+            r'<span class="string">\1</span>',
+        ),
+        (re.compile(r"('.*?'|\".*?\")"), r'<span class="string">\1</span>'),
+        (re.compile(r'(#.*?)$', re.MULTILINE), r'<span class="comment">\1</span>'),
+        (_FUNCTION_CALL, r'<span class="function">\1</span>('),
+    ],
+    "javascript": [
+        (
+            re.compile(r'\b(const|let|var|function|if|else|for|while|return|import|export|from|async|await|try|catch|new|class|this|true|false|null|undefined)\b'),
+            r'<span class="keyword">\1</span>',
+        ),
+        (re.compile(r"('.*?'|\".*?\"|`.*?`)"), r'<span class="string">\1</span>'),
+        (re.compile(r'(//.*?)$', re.MULTILINE), r'<span class="comment">\1</span>'),
+        (_FUNCTION_CALL, r'<span class="function">\1</span>('),
+    ],
+}
+
+
+if _pygments_highlight is not None:
+    _HTML_FORMATTER = HtmlFormatter(nowrap=True)
+
+    @lru_cache(maxsize=32)
+    def _get_lexer(language: str):
+        """言語名からレクサを取得（言語ごとに1度だけ解決）"""
+        try:
+            return get_lexer_by_name(language, stripall=False)
+        except ClassNotFound:
+            return None
 
 
 def _highlight_code(code: str, language: str) -> str:
-    """簡易シンタックスハイライト"""
-    code = html.escape(code)
+    """シンタックスハイライト
 
-    if language == "python":
-        # キーワード
-        keywords = r'\b(def|class|if|else|elif|for|while|return|import|from|as|try|except|with|in|not|and|or|True|False|None)\b'
-        code = re.sub(keywords, r'<span class="keyword">\1</span>', code)
-        # 文字列
-        code = re.sub(r'(&quot;.*?&quot;|&#x27;.*?&#x27;)', r'<span class="string">\1</span>', code)
-        code = re.sub(r"('.*?'|\".*?\")", r'<span class="string">\1</span>', code)
-        # コメント
-        code = re.sub(r'(#.*?)$', r'<span class="comment">\1</span>', code, flags=re.MULTILINE)
-        # 関数呼び出し
-        code = re.sub(r'\b(\w+)\(', r'<span class="function">\1</span>(', code)
-
-    elif language == "javascript":
-        keywords = r'\b(const|let|var|function|if|else|for|while|return|import|export|from|async|await|try|catch|new|class|this|true|false|null|undefined)\b'
-        code = re.sub(keywords, r'<span class="keyword">\1</span>', code)
-        code = re.sub(r"('.*?'|\".*?\"|`.*?`)", r'<span class="string">\1</span>', code)
-        code = re.sub(r'(//.*?)$', r'<span class="comment">\1</span>', code, flags=re.MULTILINE)
-        code = re.sub(r'\b(\w+)\(', r'<span class="function">\1</span>(', code)
+    Pygmentsがあれば1パスのトークナイズで正確にハイライトする
+    （逐次の正規表現置換と違い、文字列内のキーワードを誤検出しない）。
+    無ければ従来の正規表現テーブルにフォールバック。
+    """
+    if _pygments_highlight is not None:
+        lexer = _get_lexer(language)
+        if lexer is not None:
+            return _pygments_highlight(code, lexer, _HTML_FORMATTER)
 
+    code = html.escape(code)
+    for pattern, replacement in _HIGHLIGHTERS.get(language, ()):
+        code = pattern.sub(replacement, code)
     return code
 
 
+def render_slide_bytes(visual_spec: dict, section_type: str) -> tuple[str, bytes]:
+    """スライドをMIMEタイプと生バイト列で返す（Storage保存用）
+
+    保存経路ではbase64のencode→decode往復が無駄なので、data URLを
+    経由せずバイト列をそのまま渡す。data URLが必要なのはプレビューの
+    HTTP境界だけで、そちらはgenerate_slide_data_urlを使う。
+    """
+    html_content = render_slide_html(visual_spec, section_type)
+    return "text/html", html_content.encode("utf-8")
+
+
 def generate_slide_data_url(visual_spec: dict, section_type: str) -> str:
     """スライドHTMLをdata URLとして返す（プレビュー用）"""
-    import base64
+    key = (visual_hash(visual_spec), section_type)
+    cached = _DATA_URL_CACHE.get(key)
+    if cached is not None:
+        _DATA_URL_CACHE.move_to_end(key)
+        return cached
+
     html_content = render_slide_html(visual_spec, section_type)
     encoded = base64.b64encode(html_content.encode("utf-8")).decode("utf-8")
-    return f"data:text/html;base64,{encoded}"
+    data_url = f"data:text/html;base64,{encoded}"
+
+    _DATA_URL_CACHE[key] = data_url
+    if len(_DATA_URL_CACHE) > _DATA_URL_CACHE_MAX:
+        _DATA_URL_CACHE.popitem(last=False)
+    return data_url
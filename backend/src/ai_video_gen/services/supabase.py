@@ -1,8 +1,10 @@
 """Supabaseクライアント"""
 
+import asyncio
 from functools import lru_cache
 
-from supabase import Client, create_client
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, create_async_client, create_client
 
 from ai_video_gen.config import settings
 
@@ -13,6 +15,87 @@ def get_supabase_client() -> Client:
     return create_client(settings.supabase_url, settings.supabase_service_key)
 
 
+# 非同期クライアント（シングルトン）。
+# 同期クライアントは.execute()のたびにイベントループをブロックするため、
+# リクエストホットパスではこちらを使う
+_async_client: AsyncClient | None = None
+_async_client_lock = asyncio.Lock()
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """非同期Supabaseクライアントを取得（シングルトン・接続プール共有）"""
+    global _async_client
+    if _async_client is None:
+        async with _async_client_lock:
+            if _async_client is None:
+                _async_client = await create_async_client(
+                    settings.supabase_url,
+                    settings.supabase_service_key,
+                    options=AsyncClientOptions(
+                        # keep-aliveプールを共有して接続ごとのTCP+TLSハンドシェイクを排除
+                        httpx_client=httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_keepalive_connections=50,
+                                max_connections=200,
+                            ),
+                        ),
+                    ),
+                )
+    return _async_client
+
+
+def fetch_project_with_sections(
+    project_id: str, project_cols: str, section_cols: str
+) -> tuple[dict | None, list[dict]]:
+    """プロジェクトとセクションを1回の埋め込みクエリで取得
+
+    別々に2往復するのをやめ、PostgRESTの埋め込み（projects→sections）で
+    1リクエストに畳む。セクションはsection_index昇順で返す。
+    プロジェクトが存在しない場合は(None, [])。
+    """
+    client = get_supabase_client()
+    result = (
+        client.table("projects")
+        .select(f"{project_cols},sections({section_cols})")
+        .eq("id", project_id)
+        .order("section_index", foreign_table="sections")
+        .execute()
+    )
+    if not result.data:
+        return None, []
+    project = result.data[0]
+    sections = project.pop("sections", None) or []
+    return project, sections
+
+
+def upload_to_storage(bucket: str, path: str, data: bytes, content_type: str) -> str | None:
+    """Supabase Storageへアップロードして公開URLを返す
+
+    巨大なbase64 data URLをDBカラムに入れる代わりに使う。
+    Storageが未設定・到達不能な環境ではNoneを返し、呼び出し側は
+    従来のdata URLにフォールバックする。
+    """
+    try:
+        client = get_supabase_client()
+        storage = client.storage.from_(bucket)
+        storage.upload(path, data, {"content-type": content_type, "upsert": "true"})
+        return storage.get_public_url(path)
+    except Exception:
+        return None
+
+
+async def upload_to_storage_async(
+    bucket: str, path: str, data: bytes, content_type: str
+) -> str | None:
+    """upload_to_storageのスレッドオフロード版
+
+    Storageクライアントは同期HTTPのため、イベントループ上で直接呼ぶと
+    アップロード中に並走するリクエストを全て止めてしまう。
+    非同期パスからはこちらを使う。
+    """
+    return await asyncio.to_thread(upload_to_storage, bucket, path, data, content_type)
+
+
 # グローバルクライアント
 supabase_client = None
 
@@ -0,0 +1 @@
+"""ユーティリティ"""
@@ -0,0 +1,42 @@
+"""セクションのコンテンツハッシュ
+
+sectionsテーブルのcontent_hash列にステージごとのハッシュをJSONで持ち、
+入力（ナレーションテキスト・visual_spec）が変わっていないセクションの
+再生成をスキップする判定に使う。
+"""
+
+from hashlib import sha256
+
+import orjson
+
+
+def narration_hash(text: str) -> str:
+    """ナレーションテキストのハッシュ"""
+    return sha256(text.encode()).hexdigest()
+
+
+def visual_hash(visual_spec: dict) -> str:
+    """visual_specのハッシュ（キー順を正規化して辞書の並びに依存しない）"""
+    return sha256(orjson.dumps(visual_spec, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def parse_stage_hashes(raw: str | None) -> dict[str, str]:
+    """content_hash列の値をステージ→ハッシュの辞書に展開"""
+    if not raw:
+        return {}
+    try:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def merge_stage_hash(raw: str | None, stage: str, digest: str) -> str:
+    """指定ステージのハッシュを更新したcontent_hash値を返す
+
+    他ステージのハッシュは保持する（ナレーションとビジュアルが
+    同じ列を共有するため）。
+    """
+    hashes = parse_stage_hashes(raw)
+    hashes[stage] = digest
+    return orjson.dumps(hashes, option=orjson.OPT_SORT_KEYS).decode()
@@ -0,0 +1,72 @@
+"""コンテンツハッシュテスト
+
+content_hashは「どのセクションを再生成しないか」を黙って決めるため、
+ハッシュが安定していること・入力の変更で確実に変わることを固定する。
+"""
+
+from ai_video_gen.utils.hashing import (
+    merge_stage_hash,
+    narration_hash,
+    parse_stage_hashes,
+    visual_hash,
+)
+
+
+def test_narration_hash_stable_and_invalidates():
+    """同じテキストは同じハッシュ、変更で必ず変わる"""
+    assert narration_hash("こんにちは") == narration_hash("こんにちは")
+    assert narration_hash("こんにちは") != narration_hash("こんにちは。")
+    assert narration_hash("") == narration_hash("")
+
+
+def test_visual_hash_ignores_key_order():
+    """visual_specは辞書のキー順に依存しない"""
+    spec_a = {"heading": "見出し", "bullets": ["a", "b"]}
+    spec_b = {"bullets": ["a", "b"], "heading": "見出し"}
+    assert visual_hash(spec_a) == visual_hash(spec_b)
+
+
+def test_visual_hash_invalidates_on_change():
+    """値・ネスト・リスト順の変更でハッシュが変わる"""
+    base = {"heading": "見出し", "bullets": ["a", "b"]}
+    assert visual_hash(base) != visual_hash({"heading": "別見出し", "bullets": ["a", "b"]})
+    assert visual_hash(base) != visual_hash({"heading": "見出し", "bullets": ["b", "a"]})
+    assert visual_hash(base) != visual_hash({"heading": "見出し"})
+
+
+def test_parse_stage_hashes_handles_bad_input():
+    """未設定・破損・非dictは空dict扱い（スキップ判定が誤発動しない）"""
+    assert parse_stage_hashes(None) == {}
+    assert parse_stage_hashes("") == {}
+    assert parse_stage_hashes("{not json") == {}
+    assert parse_stage_hashes('["list"]') == {}
+
+
+def test_merge_stage_hash_roundtrip():
+    """merge→parseで書いた値がそのまま読める"""
+    raw = merge_stage_hash(None, "narration", "abc123")
+    assert parse_stage_hashes(raw) == {"narration": "abc123"}
+
+
+def test_merge_stage_hash_preserves_other_stages():
+    """別ステージの更新が既存ステージのハッシュを壊さない"""
+    raw = merge_stage_hash(None, "narration", "abc123")
+    raw = merge_stage_hash(raw, "visual", "def456")
+    assert parse_stage_hashes(raw) == {"narration": "abc123", "visual": "def456"}
+
+    # 同一ステージの更新は上書きされる
+    raw = merge_stage_hash(raw, "narration", "zzz999")
+    assert parse_stage_hashes(raw) == {"narration": "zzz999", "visual": "def456"}
+
+
+def test_skip_decision_matches_pipeline_usage():
+    """パイプラインのスキップ判定（保存値と再計算値の比較）を再現"""
+    spec = {"heading": "見出し", "bullets": ["a"]}
+    stored = merge_stage_hash(None, "visual", visual_hash(spec))
+
+    # 入力が同じ → スキップされる
+    assert parse_stage_hashes(stored).get("visual") == visual_hash(spec)
+
+    # 入力が変わった → 再生成される
+    changed = {"heading": "見出し", "bullets": ["a", "b"]}
+    assert parse_stage_hashes(stored).get("visual") != visual_hash(changed)
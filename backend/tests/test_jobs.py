@@ -0,0 +1,131 @@
+"""バックグラウンドジョブテスト"""
+
+import asyncio
+
+import pytest
+
+from ai_video_gen.api import jobs
+
+
+class _RecordingManager:
+    """ConnectionManagerの通知を記録するだけのスタブ"""
+
+    def __init__(self):
+        self.progress: list[tuple] = []
+        self.completes: list[tuple] = []
+        self.errors: list[tuple] = []
+
+    async def send_progress(self, project_id, stage, progress, message):
+        self.progress.append((project_id, stage, progress, message))
+
+    async def send_complete(self, project_id, stage, result):
+        self.completes.append((project_id, stage, result))
+
+    async def send_error(self, project_id, stage, message):
+        self.errors.append((project_id, stage, message))
+
+
+@pytest.fixture
+def recording_manager(monkeypatch):
+    stub = _RecordingManager()
+    monkeypatch.setattr(jobs, "manager", stub)
+    return stub
+
+
+@pytest.fixture
+def fresh_queue(monkeypatch):
+    """テストごとに独立した小さめの有界キューへ差し替える"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    return queue
+
+
+async def _run_until_drained(queue: asyncio.Queue) -> asyncio.Task:
+    """ワーカーを起動してキューが空になるまで待ち、タスクを止める"""
+    worker = asyncio.create_task(jobs._worker())
+    try:
+        await asyncio.wait_for(queue.join(), timeout=1.0)
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+    return worker
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job_returns_id(fresh_queue):
+    """enqueueはjob_idを返し、待機数に反映される"""
+
+    async def runner():
+        return {}
+
+    job_id = await jobs.enqueue_job("p1", "compose", runner)
+    assert isinstance(job_id, str)
+    assert job_id
+    assert jobs.get_pending_job_count() == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job_backpressure(fresh_queue):
+    """キュー満杯時のenqueueは空きが出るまで待機する"""
+
+    async def runner():
+        return {}
+
+    await jobs.enqueue_job("p1", "compose", runner)
+    await jobs.enqueue_job("p1", "compose", runner)
+    assert jobs.get_pending_job_count() == 2
+
+    # 3件目（maxsize=2超過）はブロックし、積み上がらない
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(
+            jobs.enqueue_job("p1", "compose", runner), timeout=0.05
+        )
+    assert jobs.get_pending_job_count() == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_job_and_notifies(fresh_queue, recording_manager):
+    """ワーカーはジョブを実行し、開始進捗と完了を通知する"""
+
+    async def runner():
+        return {"ok": True}
+
+    await jobs.enqueue_job("p1", "compose", runner)
+    await _run_until_drained(fresh_queue)
+
+    assert recording_manager.progress[0][:2] == ("p1", "compose")
+    assert recording_manager.completes == [("p1", "compose", {"ok": True})]
+    assert recording_manager.errors == []
+
+
+@pytest.mark.asyncio
+async def test_worker_wraps_list_result(fresh_queue, recording_manager):
+    """リストを返すジョブの結果はresultsキーに包まれる"""
+
+    async def runner():
+        return [{"section": 1}, {"section": 2}]
+
+    await jobs.enqueue_job("p1", "visuals", runner)
+    await _run_until_drained(fresh_queue)
+
+    assert recording_manager.completes == [
+        ("p1", "visuals", {"results": [{"section": 1}, {"section": 2}]})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_worker_reports_error_and_continues(fresh_queue, recording_manager):
+    """失敗ジョブはエラー通知され、後続ジョブは処理される"""
+
+    async def bad():
+        raise RuntimeError("boom")
+
+    async def good():
+        return {"ok": 1}
+
+    await jobs.enqueue_job("p1", "compose", bad)
+    await jobs.enqueue_job("p2", "compose", good)
+    await _run_until_drained(fresh_queue)
+
+    assert recording_manager.errors == [("p1", "compose", "boom")]
+    assert recording_manager.completes == [("p2", "compose", {"ok": 1})]
@@ -0,0 +1,80 @@
+"""LLM応答キャッシュテスト"""
+
+import json
+import time
+
+import pytest
+
+from ai_video_gen.config import settings
+from ai_video_gen.feedback import llm_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """キャッシュをテスト用ディレクトリに向け、有効化する"""
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(settings, "llm_cache_dir", str(tmp_path))
+    return tmp_path
+
+
+def test_make_key_is_deterministic():
+    """同じ入力は同じキー、異なる入力は異なるキー"""
+    assert llm_cache.make_key("a", "b") == llm_cache.make_key("a", "b")
+    assert llm_cache.make_key("a", "b") != llm_cache.make_key("a", "c")
+
+
+def test_make_key_separates_parts():
+    """要素の区切りが異なれば連結結果が同じでもキーは変わる"""
+    assert llm_cache.make_key("ab", "c") != llm_cache.make_key("a", "bc")
+
+
+@pytest.mark.asyncio
+async def test_get_miss_returns_none(cache_dir):
+    """未保存のキーはNone"""
+    assert await llm_cache.get(llm_cache.make_key("missing")) is None
+
+
+@pytest.mark.asyncio
+async def test_set_get_roundtrip(cache_dir):
+    """保存した値がそのまま返る"""
+    key = llm_cache.make_key("visual_diff", "画像A", "画像B")
+    value = {"overall_preference": "ダーク背景を好む", "changes": []}
+
+    await llm_cache.set(key, value)
+    assert await llm_cache.get(key) == value
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_evicted(cache_dir):
+    """TTL超過のエントリはNoneを返し、ファイルも消える"""
+    key = llm_cache.make_key("expired")
+    await llm_cache.set(key, {"ok": 1})
+
+    # saved_atをTTLより過去に書き換えて期限切れを再現する
+    path = cache_dir / f"{key}.json"
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    entry["saved_at"] = time.time() - (settings.llm_cache_ttl_days + 1) * 86400
+    path.write_text(json.dumps(entry), encoding="utf-8")
+
+    assert await llm_cache.get(key) is None
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_corrupt_entry_returns_none(cache_dir):
+    """壊れたJSONは例外にせずNone扱い"""
+    key = llm_cache.make_key("corrupt")
+    (cache_dir / f"{key}.json").write_text("{not json", encoding="utf-8")
+
+    assert await llm_cache.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_is_noop(cache_dir, monkeypatch):
+    """llm_cache_enabled=Falseでは保存も参照もしない"""
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    key = llm_cache.make_key("disabled")
+
+    await llm_cache.set(key, {"ok": 1})
+    assert not (cache_dir / f"{key}.json").exists()
+    assert await llm_cache.get(key) is None
@@ -0,0 +1,23 @@
+-- 修正統計の集計をDB側で行うRPC
+-- 全行をクライアントへ転送してPythonで数えるのではなく、
+-- Postgresのgroup byで集計した小さなJSONだけを返す
+CREATE OR REPLACE FUNCTION correction_stats() RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+  SELECT jsonb_build_object(
+    'total', count(*),
+    'by_stage', COALESCE(
+      (SELECT jsonb_object_agg(stage, c)
+       FROM (SELECT stage, count(*) c FROM corrections GROUP BY stage) s),
+      '{}'::jsonb
+    ),
+    'by_category', COALESCE(
+      (SELECT jsonb_object_agg(category, c)
+       FROM (SELECT category, count(*) c FROM corrections GROUP BY category) s),
+      '{}'::jsonb
+    )
+  )
+  FROM corrections;
+$$;
+
+-- group byを軽くする複合インデックス
+CREATE INDEX idx_corrections_stage_category ON corrections(stage, category);
@@ -0,0 +1,4 @@
+-- 適用可能な好みのOR検索を支えるインデックス
+CREATE INDEX idx_preferences_scope_active ON preferences(scope, is_active)
+  WHERE is_active;
+CREATE INDEX idx_preferences_project_section ON preferences(project_id, section_type, is_active);
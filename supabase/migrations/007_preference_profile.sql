@@ -0,0 +1,52 @@
+-- 好みプロファイルのマテリアライズドビュー
+-- 全好みを転送してPythonで集計する代わりに、集計済みJSONを1行だけ返す
+CREATE MATERIALIZED VIEW preference_profile AS
+SELECT
+  1 AS id,
+  jsonb_build_object(
+    'total_preferences', count(*),
+    'by_category', COALESCE(
+      (SELECT jsonb_object_agg(category, c)
+       FROM (SELECT category, count(*) c FROM preferences
+             WHERE is_active AND confidence >= 0.5 GROUP BY category) s),
+      '{}'::jsonb
+    ),
+    'by_scope', COALESCE(
+      (SELECT jsonb_object_agg(scope, c)
+       FROM (SELECT scope, count(*) c FROM preferences
+             WHERE is_active AND confidence >= 0.5 GROUP BY scope) s),
+      '{}'::jsonb
+    ),
+    'high_confidence', COALESCE(
+      (SELECT jsonb_agg(jsonb_build_object(
+         'id', preference_id, 'description', description, 'confidence', confidence
+       ) ORDER BY confidence DESC)
+       FROM preferences WHERE is_active AND confidence >= 0.85),
+      '[]'::jsonb
+    ),
+    'suggestions', COALESCE(
+      (SELECT jsonb_agg(jsonb_build_object(
+         'id', preference_id, 'description', description, 'confidence', confidence
+       ) ORDER BY confidence DESC)
+       FROM preferences WHERE is_active AND confidence >= 0.5 AND confidence < 0.85),
+      '[]'::jsonb
+    )
+  ) AS profile
+FROM preferences
+WHERE is_active AND confidence >= 0.5;
+
+-- REFRESH CONCURRENTLY に必要なユニークインデックス
+CREATE UNIQUE INDEX idx_preference_profile_id ON preference_profile(id);
+
+-- preferencesの書き込みでプロファイルを再構築するトリガー
+CREATE OR REPLACE FUNCTION refresh_preference_profile() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  REFRESH MATERIALIZED VIEW CONCURRENTLY preference_profile;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_refresh_preference_profile
+AFTER INSERT OR UPDATE OR DELETE ON preferences
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_preference_profile();
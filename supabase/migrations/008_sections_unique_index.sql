@@ -0,0 +1,4 @@
+-- upsert(on_conflict="project_id,section_index") のための一意制約。
+-- 脚本更新時のdelete+insertを1回のupsertに置き換える前提となる
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sections_project_section_index
+  ON sections (project_id, section_index);
@@ -0,0 +1,4 @@
+-- 合計再生時間の非正規化列。
+-- get_compose_statusのたびに全セクションのdurationを合計するのをやめ、
+-- ナレーション生成時に1回だけ計算して保存する
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS total_duration FLOAT;
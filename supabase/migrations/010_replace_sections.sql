@@ -0,0 +1,15 @@
+-- セクションの一括置き換えRPC。
+-- クライアント側のupsert+末尾削除（2往復、置き換え途中が見える）を
+-- 1往復のトランザクションに畳む
+CREATE OR REPLACE FUNCTION replace_sections(p_project_id uuid, p_sections jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM sections WHERE project_id = p_project_id;
+  INSERT INTO sections (project_id, section_index, type, duration, narration, visual_spec)
+  SELECT p_project_id, s.section_index, s.type, s.duration, s.narration, s.visual_spec
+  FROM jsonb_to_recordset(p_sections)
+    AS s(section_index int, type text, duration float, narration text, visual_spec jsonb);
+END;
+$$;
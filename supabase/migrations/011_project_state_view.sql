@@ -0,0 +1,4 @@
+-- 合成ステータスのポーリング用の細いビュー。
+-- 巨大なscript JSONBを含む行全体ではなく3列だけを返す
+CREATE OR REPLACE VIEW project_state AS
+  SELECT id, state, updated_at FROM projects;